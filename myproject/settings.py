@@ -35,12 +35,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'store.routers.PrimaryPinningMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.cart_count',
             ],
         },
     },
@@ -75,6 +79,104 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=production: WAL, PRAGMA tinh chỉnh (store/db.py) và kết nối dùng lại
+DB_PROFILE = os.environ.get('DB_PROFILE', 'development')
+SQLITE_PRAGMAS = {}
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Lấy khoá ghi ngay khi BEGIN để busy_timeout có tác dụng thay vì lỗi "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        # Thời gian chờ khoá duy nhất (ms); không đặt thêm 'timeout' trong OPTIONS vì PRAGMA này ghi đè nó
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': 128 * 1024 * 1024,
+        'cache_size': -20000,  # ~20MB
+        'temp_store': 'MEMORY',
+    }
+
+# Read replica cho danh mục: bản sao SQLite được start.sh đồng bộ định kỳ bằng `manage.py sync_replica`
+REPLICA_DB_PATH = os.environ.get('REPLICA_DB_PATH')
+REPLICA_STICKY_SECONDS = 15
+# Các view đọc dữ liệu người dùng vừa ghi luôn dùng primary
+REPLICA_PINNED_VIEWS = {
+    'cart', 'cart_summary', 'checkout', 'order_complete', 'profile',
+    'add_to_cart', 'remove_from_cart', 'update_cart_quantity',
+}
+if REPLICA_DB_PATH:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': REPLICA_DB_PATH,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['store.routers.CatalogReplicaRouter']
+
+# Cache: các worker gunicorn trên Render cần chia sẻ cùng một cache để
+# generation của danh mục được tăng ở một worker có hiệu lực ở mọi worker.
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', '/tmp/lokki-cache'),
+        }
+    }
+
+# Phân trang danh mục: 'keyset' (theo cursor, không COUNT/OFFSET) hoặc 'offset'
+CATALOG_PAGINATION = os.environ.get('CATALOG_PAGINATION', 'keyset')
+
+# Trang tất cả sản phẩm được stream theo từng khối thay vì dựng cả trang trong bộ nhớ
+PHONE_LIST_STREAMING = os.environ.get('PHONE_LIST_STREAMING', '1') == '1'
+
+# Giữ hàng khi thêm vào giỏ (flash sale); phần giữ hết hạn sau TTL giây
+STOCK_RESERVATION = os.environ.get('STOCK_RESERVATION', '0') == '1'
+STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', 15 * 60))
+
+# Số liệu theo view (store/metrics.py): gom trong tiến trình, ghi dồn vào file SQLite
+# dùng chung cho mọi worker sau mỗi METRICS_FLUSH_INTERVAL giây; xem tại /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DB_PATH = os.environ.get('METRICS_DB_PATH', '/tmp/lokki-metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 10
+# Cảnh báo trong log khi một request chạy quá số truy vấn này (0 để tắt)
+METRICS_QUERY_BUDGET = int(os.environ.get('METRICS_QUERY_BUDGET', 30))
+
+# Profile theo yêu cầu (store/profiling.py): quản trị viên gửi header X-Profile hoặc ?_profile=
+# kèm token đã ký lấy ở /admin/profiles/ (hết hạn sau PROFILE_TOKEN_MAX_AGE giây)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') == '1'
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/lokki-profiles')
+PROFILE_KEEP = 20
+# 'auto' dùng pyinstrument nếu đã cài, nếu không thì cProfile
+PROFILER = os.environ.get('PROFILER', 'auto')
+
+# Thông báo đơn hàng: ghi vào outbox, gửi bởi `manage.py notification_worker`
+NOTIFICATION_BACKEND = os.environ.get('NOTIFICATION_BACKEND', 'store.notifications.ConsoleBackend')
+NOTIFICATION_FILE_PATH = os.environ.get('NOTIFICATION_FILE_PATH', '/tmp/lokki-notifications.log')
+NOTIFICATION_MAX_ATTEMPTS = 8
+NOTIFICATION_RETRY_BASE = 30  # giây, nhân đôi sau mỗi lần lỗi
+NOTIFICATION_RETRY_MAX = 60 * 60
+
+# Session: SESSION_STORE chọn nơi lưu
+#   'signed_cookies' - toàn bộ session nằm trong cookie đã ký, không đọc/ghi CSDL
+#   'cached_db'      - đọc từ cache, chỉ ghi CSDL khi session thay đổi (mặc định)
+#   'db'             - backend mặc định của Django
+SESSION_STORE = os.environ.get('SESSION_STORE', 'cached_db')
+SESSION_BASE_ENGINE = 'django.contrib.sessions.backends.%s' % SESSION_STORE
+SESSION_ENGINE = 'store.sessions'
+SESSION_SAVE_EVERY_REQUEST = False
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -133,15 +235,28 @@ ADMIN_INDEX_TITLE = "Chức năng quản trị"
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{asctime} {levelname} {name} [{process}] {message}',
+            'style': '{',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
         },
     },
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        # Cảnh báo vượt ngân sách truy vấn
+        'store.metrics': {
+            'level': os.environ.get('METRICS_LOG_LEVEL', 'WARNING'),
+        },
+    },
 }
 
 # Security settings for production
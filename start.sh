@@ -0,0 +1,40 @@
+#!/usr/bin/env bash
+# Chạy web và notification_worker trong cùng container (dùng chung file SQLite).
+# Một trong hai tiến trình thoát thì dừng luôn tiến trình còn lại và thoát với
+# mã lỗi, để Render khởi động lại cả service thay vì chạy web không có worker.
+# Kèm theo là các vòng lặp định kỳ: ANALYZE mỗi SQLITE_ANALYZE_INTERVAL giây
+# (mặc định 1 giờ) để số dòng ước lượng của admin không cũ, và khi có
+# REPLICA_DB_PATH thì sync_replica mỗi REPLICA_SYNC_INTERVAL giây (mặc định 60)
+# để replica danh mục không trễ quá một phút.
+set -u
+
+# Cron job của Render là service riêng, không đọc được file SQLite trên disk này
+every() {
+    interval=$1
+    shift
+    while true; do
+        "$@" || echo "$* lỗi" >&2
+        sleep "$interval"
+    done
+}
+
+every "${SQLITE_ANALYZE_INTERVAL:-3600}" python manage.py refresh_sqlite_stats &
+loops=$!
+if [ -n "${REPLICA_DB_PATH:-}" ]; then
+    every "${REPLICA_SYNC_INTERVAL:-60}" python manage.py sync_replica &
+    loops="$loops $!"
+fi
+
+python manage.py notification_worker &
+worker=$!
+gunicorn myproject.wsgi --workers 2 --threads 4 --worker-class gthread &
+web=$!
+
+trap 'kill -TERM "$worker" "$web" $loops 2>/dev/null' TERM INT
+
+wait -n "$worker" "$web"
+status=$?
+kill -TERM "$worker" "$web" $loops 2>/dev/null
+wait
+# Worker thoát "bình thường" vẫn là lỗi với service
+exit $(( status == 0 ? 1 : status ))
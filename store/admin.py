@@ -1,8 +1,12 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Profile, Brand, Phone, Cart, Order, OrderItem
+from .models import Profile, Brand, Phone, Cart, NotificationOutbox, Order, OrderItem
+from .orders import allowed_sources, bulk_transition, can_transition, with_item_totals
+from .pagination import EstimatedCountPaginator
+from django.db.models import DecimalField, ExpressionWrapper, F
 from django.utils import timezone
 
 class ProfileInline(admin.StackedInline):
@@ -38,13 +42,40 @@ class BrandAdmin(admin.ModelAdmin):
 class PhoneAdmin(admin.ModelAdmin):
     list_display = ('name', 'brand', 'price', 'stock', 'available')
     list_filter = ('brand', 'available')
+    list_select_related = ('brand',)
     search_fields = ('name', 'description')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'phone', 'quantity', 'total_price']
-    list_filter = ['user']
+    list_display = ['user', 'phone', 'quantity', 'get_total']
+    # Chỉ liệt kê người dùng đang có giỏ hàng thay vì toàn bộ bảng User
+    list_filter = [('user', admin.RelatedOnlyFieldListFilter)]
+    list_select_related = ('user', 'phone')
     search_fields = ['user__username', 'phone__name']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(line_total=ExpressionWrapper(
+            F('quantity') * F('phone__price'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ))
+
+    def get_total(self, obj):
+        return '{:.2f}'.format(obj.line_total)
+    get_total.short_description = 'Thành tiền'
+    get_total.admin_order_field = 'line_total'
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'order', 'message', 'attempts', 'available_at', 'sent_at', 'failed_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('order', 'user')
+    readonly_fields = ('created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -52,6 +83,19 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
     can_delete = False
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'product':
+            # Mỗi dòng inline dùng chung một danh sách sản phẩm thay vì tự truy vấn lại
+            choices = getattr(request, '_store_product_choices', None)
+            if choices is None:
+                choices = request._store_product_choices = list(field.choices)
+            field.choices = choices
+        return field
+
     def get_total(self, obj):
         if obj.price is None or obj.quantity is None:
             return format_html('<span>$0.00</span>')
@@ -59,14 +103,46 @@ class OrderItemInline(admin.TabularInline):
         return format_html('<span>${}</span>', '{:.2f}'.format(total))
     get_total.short_description = 'Tổng tiền'
 
+class OrderAdminForm(forms.ModelForm):
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        old = self.instance.status
+        if self.instance.pk and status != old and not can_transition(old, status):
+            raise forms.ValidationError(
+                'Không thể chuyển từ "%s" sang "%s".'
+                % (self.instance.get_status_display(), dict(Order.STATUS_CHOICES)[status])
+            )
+        return status
+
+
+def _transition_action(status, label):
+    def action(modeladmin, request, queryset):
+        selected = list(queryset.values_list('pk', flat=True))
+        changed = bulk_transition(selected, status, request.user)
+        modeladmin.message_user(request, 'Đã chuyển %d/%d đơn hàng sang "%s".' % (len(changed), len(selected), label))
+        if len(changed) < len(selected):
+            modeladmin.message_user(
+                request, '%d đơn hàng bị bỏ qua vì trạng thái hiện tại không cho phép.' % (len(selected) - len(changed)),
+                messages.WARNING,
+            )
+    action.__name__ = 'mark_%s' % status
+    action.short_description = 'Chuyển sang "%s"' % label
+    return action
+
 @admin.register(Order) 
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'full_name', 'phone', 'get_total', 'status', 'get_status_display', 'created_at')
+    form = OrderAdminForm
+    actions = [_transition_action(status, label) for status, label in Order.STATUS_CHOICES if allowed_sources(status)]
+    list_display = ('id', 'full_name', 'phone', 'get_item_count', 'get_total', 'status', 'get_status_display', 'created_at')
     list_filter = ('status', 'payment_method', 'created_at')
     list_editable = ('status',)  # Cho phép sửa trạng thái trực tiếp từ danh sách
     search_fields = ('full_name', 'phone', 'address')
     ordering = ('-created_at',)
     inlines = [OrderItemInline]
+    # Bảng đơn hàng lớn: không COUNT(*) toàn bảng, không đếm theo từng bộ lọc
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
     
     fieldsets = (
         ('Thông tin khách hàng', {
@@ -82,6 +158,14 @@ class OrderAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('created_at',)  # Chỉ để created_at là readonly
 
+    def get_queryset(self, request):
+        return with_item_totals(super().get_queryset(request))
+
+    def get_item_count(self, obj):
+        return obj.item_count
+    get_item_count.short_description = 'Số sản phẩm'
+    get_item_count.admin_order_field = 'item_count'
+
     def get_total(self, obj):
         if obj.total is None:
             return format_html('<b>$0.00</b>')
@@ -114,19 +198,41 @@ class OrderAdmin(admin.ModelAdmin):
         )
     get_status_display.short_description = 'Trạng thái'
 
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', OrderAdminForm)
+        return super().get_changelist_form(request, **kwargs)
+
     def save_model(self, request, obj, form, change):
-        if change and 'status' in form.changed_data:
-            from django.contrib.admin.models import LogEntry, CHANGE
-            from django.contrib.contenttypes.models import ContentType
-            LogEntry.objects.log_action(
-                user_id=request.user.id,
-                content_type_id=ContentType.objects.get_for_model(obj).pk,
-                object_id=obj.id,
-                object_repr=str(obj),
-                action_flag=CHANGE,
-                change_message=f'Đã thay đổi trạng thái sang {form.cleaned_data["status"]}'
+        if not (change and 'status' in form.changed_data):
+            return super().save_model(request, obj, form, change)
+        # Trạng thái đi qua bulk_transition (kiểm tra nguồn + ghi log); các trường khác lưu như thường
+        old_status, new_status = form.initial['status'], obj.status
+        if set(form.changed_data) - {'status'}:
+            obj.status = old_status
+            super().save_model(request, obj, form, change)
+        obj.status_handled = True
+        if bulk_transition([obj.pk], new_status, request.user):
+            obj.status = new_status
+        else:
+            # Đơn đã được người khác chuyển trạng thái giữa lúc mở form và lúc lưu
+            obj.status = old_status
+            labels = dict(Order.STATUS_CHOICES)
+            self.message_user(
+                request,
+                'Không thể chuyển đơn hàng #%d từ "%s" sang "%s".' % (obj.pk, labels[old_status], labels[new_status]),
+                messages.ERROR,
             )
-        super().save_model(request, obj, form, change)
+
+    def construct_change_message(self, request, form, formsets, add=False):
+        # bulk_transition đã ghi LogEntry cho việc đổi trạng thái
+        if getattr(form.instance, 'status_handled', False):
+            form.changed_data = [name for name in form.changed_data if name != 'status']
+        return super().construct_change_message(request, form, formsets, add)
+
+    def log_change(self, request, obj, message):
+        if getattr(obj, 'status_handled', False) and not message:
+            return None
+        return super().log_change(request, obj, message)
 
     class Media:
         css = {
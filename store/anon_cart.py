@@ -0,0 +1,97 @@
+"""Giỏ hàng cho khách chưa đăng nhập, lưu trong cookie đã ký.
+
+Cookie có dạng ``"12-1_15-2"`` (phone_id-số lượng) kèm chữ ký của Django,
+nên thêm vào giỏ không ghi gì vào CSDL. Khi khách đăng nhập hoặc đăng ký,
+``merge_into`` gộp cookie vào bảng Cart bằng bulk_update/bulk_create (và giữ
+hàng nếu ``STOCK_RESERVATION`` bật).
+"""
+from django.conf import settings
+from django.db import transaction
+
+from . import inventory
+from .cart import CENTS, EMPTY_CART, CartLine, CartSnapshot, invalidate_cart_count
+from .models import Cart, Phone
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'store.anon_cart'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+MAX_LINES = 50
+MAX_QUANTITY = 99
+
+
+def read(request):
+    """Trả về ``{phone_id: số lượng}``; cookie hỏng hoặc bị sửa thì coi như giỏ trống."""
+    value = request.get_signed_cookie(COOKIE_NAME, default='', salt=COOKIE_SALT)
+    items = {}
+    for pair in value.split('_'):
+        try:
+            phone_id, quantity = (int(part) for part in pair.split('-'))
+        except ValueError:
+            continue
+        if phone_id > 0 and quantity > 0:
+            items[phone_id] = min(quantity, MAX_QUANTITY)
+    return items
+
+
+def write(response, items):
+    items = {pk: quantity for pk, quantity in items.items() if quantity > 0}
+    if not items:
+        response.delete_cookie(COOKIE_NAME)
+        return
+    value = '_'.join('%d-%d' % (pk, min(quantity, MAX_QUANTITY)) for pk, quantity in list(items.items())[:MAX_LINES])
+    response.set_signed_cookie(
+        COOKIE_NAME, value, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+        httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def count(request):
+    return sum(read(request).values())
+
+
+def load_snapshot(items):
+    """Dựng CartSnapshot từ cookie; ``CartLine.id`` là phone_id vì chưa có dòng Cart."""
+    if not items:
+        return EMPTY_CART
+    phones = Phone.objects.select_related('brand').in_bulk(list(items))
+    lines = tuple(
+        CartLine(pk, phones[pk], quantity, (phones[pk].price * quantity).quantize(CENTS))
+        for pk, quantity in items.items()
+        if pk in phones
+    )
+    if not lines:
+        return EMPTY_CART
+    return CartSnapshot(lines, sum(line.total_price for line in lines))
+
+
+def merge_into(request, response, user):
+    """Gộp giỏ trong cookie vào Cart của ``user`` và xoá cookie trên ``response``.
+
+    Khi chế độ giữ hàng bật, mỗi dòng được giữ hàng như khi thêm vào giỏ;
+    dòng không đủ hàng bị bỏ qua. Trả về danh sách Phone đã bị bỏ qua.
+    """
+    items = read(request)
+    response.delete_cookie(COOKIE_NAME)
+    if not items:
+        return []
+    phones = Phone.objects.only('pk', 'name').in_bulk(list(items))
+    skipped = []
+    with transaction.atomic():
+        existing = {line.phone_id: line for line in Cart.objects.filter(user=user, phone_id__in=list(phones))}
+        updated = []
+        created = []
+        for pk, quantity in items.items():
+            if pk not in phones:
+                continue
+            if inventory.enabled() and inventory.reserve(user, pk, quantity) is None:
+                skipped.append(phones[pk])
+                continue
+            if pk in existing:
+                existing[pk].quantity += quantity
+                updated.append(existing[pk])
+            else:
+                created.append(Cart(user=user, phone_id=pk, quantity=quantity))
+        Cart.objects.bulk_update(updated, ['quantity'])
+        Cart.objects.bulk_create(created)
+    invalidate_cart_count(user)
+    return skipped
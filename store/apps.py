@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .db import apply_pragmas
+        from .metrics import instrument_templates
+
+        connection_created.connect(apply_pragmas, dispatch_uid='store.db.apply_pragmas')
+        instrument_templates()
@@ -0,0 +1,84 @@
+"""Cache phân mảnh cho lưới sản phẩm (trang chủ và trang thương hiệu).
+
+Mỗi khoá cache chứa "thế hệ" (generation) hiện tại của danh mục. Khi Phone
+hoặc Brand thay đổi, signal tăng generation lên nên mọi khoá cũ tự hết hiệu
+lực mà không cần xoá từng khoá.
+"""
+import time
+
+from django.core.cache import cache
+from django.utils import translation
+from django.utils.safestring import mark_safe
+
+from . import metrics
+
+GENERATION_KEY = 'store:catalog:generation'
+GRID_TIMEOUT = 60 * 60 * 24
+HITS = 'store_grid_cache_hits_total'
+MISSES = 'store_grid_cache_misses_total'
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Khởi tạo theo thời gian để không trùng với generation đã bị evict
+        cache.add(GENERATION_KEY, int(time.time()), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation = int(time.time())
+        cache.set(GENERATION_KEY, generation, timeout=None)
+        return generation
+
+
+def grid_key(view, brand_id=None, page=None):
+    return 'store:grid:%s:%s:%s:%s:%s' % (
+        get_generation(),
+        view,
+        brand_id or '-',
+        page or 1,
+        translation.get_language() or '-',
+    )
+
+
+def get_or_render_grid(view, render, brand_id=None, page=None):
+    """Trả về HTML của lưới sản phẩm, chỉ gọi ``render()`` khi cache miss."""
+    key = grid_key(view, brand_id, page)
+    html = cache.get(key)
+    if html is not None:
+        metrics.increment(HITS)
+        return mark_safe(html)
+    metrics.increment(MISSES)
+    html = render()
+    cache.set(key, html, GRID_TIMEOUT)
+    return html
+
+
+def cached_count(name, queryset):
+    """``COUNT(*)`` chỉ chạy một lần cho mỗi generation của danh mục."""
+    key = 'store:count:%s:%s' % (get_generation(), name)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, GRID_TIMEOUT)
+    return count
+
+
+def grid_stats():
+    counters = metrics.read_counters([HITS, MISSES])
+    hits, misses = counters[HITS], counters[MISSES]
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_grid_stats():
+    metrics.reset_counters([HITS, MISSES])
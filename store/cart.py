@@ -0,0 +1,127 @@
+"""Đọc giỏ hàng trong một truy vấn duy nhất.
+
+``load_cart`` lấy các dòng giỏ hàng kèm Phone/Brand, thành tiền từng dòng
+và tổng tiền (hàm cửa sổ ``SUM() OVER ()``) trong cùng một round trip, rồi
+trả về một ``CartSnapshot`` bất biến dùng chung cho view và template.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Window
+
+from . import inventory
+from .models import Cart
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+CENTS = Decimal('0.01')
+
+# ``id`` là Cart.id, hoặc phone_id với giỏ trong cookie của khách (store.anon_cart)
+CartLine = namedtuple('CartLine', ['id', 'phone', 'quantity', 'total_price'])
+
+
+class CartSnapshot(namedtuple('CartSnapshot', ['lines', 'total'])):
+    __slots__ = ()
+
+    @property
+    def count(self):
+        return sum(line.quantity for line in self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+EMPTY_CART = CartSnapshot((), Decimal('0.00'))
+
+
+def line_total():
+    return ExpressionWrapper(F('quantity') * F('phone__price'), output_field=MONEY)
+
+
+def load_cart(user):
+    rows = (
+        Cart.objects.filter(user=user)
+        .select_related('phone__brand')
+        .annotate(
+            line_total=line_total(),
+            cart_total=Window(Sum(line_total()), output_field=MONEY),
+        )
+        .order_by('date_added', 'id')
+    )
+    lines = tuple(
+        CartLine(row.id, row.phone, row.quantity, row.line_total.quantize(CENTS))
+        for row in rows
+    )
+    if not lines:
+        return EMPTY_CART
+    # SQLite trả kết quả biểu thức không làm tròn nên tự chuẩn hoá về 2 chữ số
+    return CartSnapshot(lines, rows[0].cart_total.quantize(CENTS))
+
+
+CART_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def _cart_count_key(user_id):
+    return 'store:cart-count:%s' % user_id
+
+
+def get_cart_count(user):
+    """Tổng số lượng sản phẩm trong giỏ, đọc từ cache theo từng người dùng."""
+    if not user.is_authenticated:
+        return 0
+    key = _cart_count_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Cart.objects.filter(user=user).aggregate(total=Sum('quantity'))['total'] or 0
+        cache.set(key, count, CART_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_cart_count(user):
+    cache.delete(_cart_count_key(user.pk))
+
+
+def add_item(user, phone_id, quantity=1):
+    """Thêm vào giỏ: một câu ``UPDATE quantity = quantity + n``, chỉ INSERT khi chưa có dòng.
+
+    Trả về False nếu chế độ giữ hàng bật và sản phẩm đã hết.
+    """
+    if inventory.enabled() and inventory.reserve(user, phone_id, quantity) is None:
+        return False
+    lines = Cart.objects.filter(user=user, phone_id=phone_id)
+    if not lines.update(quantity=F('quantity') + quantity):
+        try:
+            with transaction.atomic():
+                Cart.objects.create(user=user, phone_id=phone_id, quantity=quantity)
+        except IntegrityError:
+            # Request song song vừa tạo dòng này
+            lines.update(quantity=F('quantity') + quantity)
+    invalidate_cart_count(user)
+    return True
+
+
+def set_quantity(user, line, quantity):
+    """Đặt số lượng cho một dòng giỏ hàng; số lượng < 1 thì xoá dòng."""
+    if quantity < 1:
+        remove_item(user, line)
+        return True
+    # Chỉ giữ thêm/trả lại phần chênh lệch; không đủ hàng thì phần đang giữ còn nguyên
+    if inventory.enabled() and not inventory.set_reserved(user, line.phone_id, quantity):
+        return False
+    Cart.objects.filter(pk=line.pk).update(quantity=quantity)
+    invalidate_cart_count(user)
+    return True
+
+
+def remove_item(user, line):
+    Cart.objects.filter(pk=line.pk).delete()
+    if inventory.enabled():
+        inventory.release(user, line.phone_id)
+    invalidate_cart_count(user)
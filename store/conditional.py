@@ -0,0 +1,85 @@
+"""ETag / Last-Modified cho các trang danh mục.
+
+Mỗi hàm chỉ tốn một truy vấn theo khoá chính; kết quả được nhớ trên
+``request`` để ``condition()`` gọi cả hàm ETag lẫn Last-Modified mà không
+truy vấn hai lần.
+
+Khi request còn flash message chưa hiển thị, các hàm trả về None để
+``condition()`` bỏ qua 304: trang phải được render lại để hiện (và tiêu thụ)
+thông báo, ví dụ "đã hết hàng" sau khi thêm vào giỏ thất bại.
+"""
+import hashlib
+
+from django.contrib import messages
+from django.utils import translation
+
+from . import anon_cart
+from .cart import get_cart_count
+from .models import CatalogVersion, Phone
+
+
+def _viewer(request):
+    # Trang có header riêng cho từng người dùng (tên, số lượng giỏ hàng)
+    # nên ETag phải khác nhau
+    user = request.user
+    if not user.is_authenticated:
+        # Giỏ của khách nằm trong cookie: băm giá trị cookie thay vì đọc CSDL
+        cookie = request.COOKIES.get(anon_cart.COOKIE_NAME, '')
+        return 'anon.%s' % hashlib.md5(cookie.encode()).hexdigest()[:12]
+    return 'u%d.%d' % (user.pk, get_cart_count(user))
+
+
+def _has_messages(request):
+    # len() không đánh dấu thông báo là đã đọc
+    return len(messages.get_messages(request)) > 0
+
+
+def _catalog_state(request):
+    if not hasattr(request, '_catalog_state'):
+        request._catalog_state = CatalogVersion.current()
+    return request._catalog_state
+
+
+def catalog_etag(request, *args, **kwargs):
+    if _has_messages(request):
+        return None
+    state = _catalog_state(request)
+    return '"c%d-%s-%s-%s"' % (
+        state.version,
+        translation.get_language(),
+        _viewer(request),
+        request.GET.urlencode(),
+    )
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    if _has_messages(request):
+        return None
+    return _catalog_state(request).updated_at
+
+
+def _phone_state(request, phone_id):
+    if not hasattr(request, '_phone_state'):
+        request._phone_state = (
+            Phone.objects.filter(pk=phone_id).values_list('updated_at', 'brand__updated_at').first()
+        )
+    return request._phone_state
+
+
+def phone_etag(request, phone_id):
+    state = _phone_state(request, phone_id)
+    if state is None or _has_messages(request):
+        return None
+    return '"p%d-%s-%s-%s"' % (
+        phone_id,
+        int(max(state).timestamp() * 1000000),
+        translation.get_language(),
+        _viewer(request),
+    )
+
+
+def phone_last_modified(request, phone_id):
+    state = _phone_state(request, phone_id)
+    if state is None or _has_messages(request):
+        return None
+    return max(state)
@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import anon_cart
+from .cart import get_cart_count
+
+
+def cart_count(request):
+    # Chỉ đọc cache (hoặc CSDL) khi template thực sự dùng đến cart_count
+    def count():
+        if request.user.is_authenticated:
+            return get_cart_count(request.user)
+        return anon_cart.count(request)
+    return {'cart_count': SimpleLazyObject(count)}
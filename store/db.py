@@ -0,0 +1,47 @@
+"""Tinh chỉnh SQLite cho production.
+
+Các PRAGMA trong ``settings.SQLITE_PRAGMAS`` được chạy mỗi khi Django mở
+kết nối mới (signal ``connection_created``). Với ``CONN_MAX_AGE`` kết nối
+được dùng lại giữa các request nên chi phí này chỉ trả một lần. Kết nối
+``replica`` chỉ đọc nên bỏ qua các PRAGMA ghi (``journal_mode`` sẽ ghi lại
+header của file mà ``sync_replica`` đang chép đè).
+
+``refresh_stats`` chạy ``ANALYZE`` để cập nhật ``sqlite_stat1`` (thống kê
+cho query planner và số dòng ước lượng của ``EstimatedCountPaginator``),
+qua lệnh ``manage.py refresh_sqlite_stats`` mà start.sh chạy định kỳ.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA chỉ liên quan tới việc ghi, không chạy trên replica
+WRITE_PRAGMAS = {'journal_mode', 'synchronous'}
+
+# Số dòng tối đa ANALYZE đọc cho mỗi chỉ mục; thống kê là ước lượng nhưng lệnh luôn nhanh
+ANALYSIS_LIMIT = 1000
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.alias == 'replica':
+        pragmas = {name: value for name, value in pragmas.items() if name not in WRITE_PRAGMAS}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+    if pragmas:
+        logger.debug('Đã áp dụng PRAGMA SQLite cho %s: %s', connection.alias, pragmas)
+
+
+def refresh_stats(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA analysis_limit = %d' % ANALYSIS_LIMIT)
+        cursor.execute('ANALYZE')
+    logger.debug('Đã cập nhật thống kê SQLite cho %s', using)
@@ -0,0 +1,70 @@
+"""Danh bạ thương hiệu kèm số sản phẩm, số còn bán và khoảng giá.
+
+``BrandSummary`` được tính lại cho đúng thương hiệu bị ảnh hưởng mỗi khi một
+Phone được lưu hoặc xoá; ``manage.py rebuild_brand_summaries`` sửa sai lệch
+bằng một truy vấn gộp. Trang danh sách thương hiệu chỉ đọc một bản cache.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+
+from .cache import GRID_TIMEOUT, get_generation
+from .models import Brand, BrandSummary, Phone
+
+BrandEntry = namedtuple('BrandEntry', [
+    'id', 'name', 'description', 'logo',
+    'phone_count', 'available_count', 'min_price', 'max_price',
+])
+
+SUMMARY_AGGREGATES = {
+    'phone_count': Count('id'),
+    'available_count': Count('id', filter=Q(available=True)),
+    'min_price': Min('price'),
+    'max_price': Max('price'),
+}
+
+
+def refresh_brand_summary(brand_id):
+    stats = Phone.objects.filter(brand_id=brand_id).aggregate(**SUMMARY_AGGREGATES)
+    updated = BrandSummary.objects.filter(brand_id=brand_id).update(**stats)
+    # Thương hiệu đang bị xoá (cascade) thì không tạo lại bản tóm tắt
+    if not updated and Brand.objects.filter(pk=brand_id).exists():
+        BrandSummary.objects.create(brand_id=brand_id, **stats)
+
+
+def rebuild_brand_summaries():
+    """Tính lại toàn bộ bằng một truy vấn GROUP BY, trả về số thương hiệu."""
+    stats = {
+        row.pop('brand_id'): row
+        for row in Phone.objects.values('brand_id').annotate(**SUMMARY_AGGREGATES).order_by()
+    }
+    empty = {'phone_count': 0, 'available_count': 0, 'min_price': None, 'max_price': None}
+    summaries = [
+        BrandSummary(brand_id=brand_id, **stats.get(brand_id, empty))
+        for brand_id in Brand.objects.values_list('pk', flat=True)
+    ]
+    BrandSummary.objects.all().delete()
+    BrandSummary.objects.bulk_create(summaries)
+    return len(summaries)
+
+
+def brand_directory():
+    key = 'store:brand-directory:%s' % get_generation()
+    entries = cache.get(key)
+    if entries is None:
+        entries = []
+        for brand in Brand.objects.select_related('summary').order_by('name'):
+            summary = getattr(brand, 'summary', None)
+            entries.append(BrandEntry(
+                id=brand.pk,
+                name=brand.name,
+                description=brand.description,
+                logo=brand.logo,
+                phone_count=summary.phone_count if summary else 0,
+                available_count=summary.available_count if summary else 0,
+                min_price=summary.min_price if summary else None,
+                max_price=summary.max_price if summary else None,
+            ))
+        cache.set(key, entries, GRID_TIMEOUT)
+    return entries
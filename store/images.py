@@ -0,0 +1,135 @@
+"""Sinh ảnh thu nhỏ (WebP/JPEG) theo các bề rộng cố định cho ảnh sản phẩm,
+logo thương hiệu và avatar.
+
+Ảnh phái sinh nằm cạnh ảnh gốc trong cùng storage, ví dụ
+``phones/a.jpg`` -> ``phones/a.320w.webp`` và ``phones/a.320w.jpg``.
+Chúng được sinh ở luồng nền sau khi lưu (xem ``store.signals``) hoặc bằng
+``manage.py build_image_derivatives``. Danh sách ảnh phái sinh đã có của
+mỗi ảnh được nhớ trong cache nên render ``srcset`` không gọi
+``storage.exists()``.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from PIL import Image, ImageOps
+
+from .cache import GRID_TIMEOUT, bump_generation
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (64, 320, 640)
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+
+# Ảnh chưa có phái sinh (đang sinh ở luồng nền) chỉ được nhớ ngắn hạn
+MISSING_TIMEOUT = 60
+# Khoá trong kết quả cache: ảnh gốc quá nhỏ, không có phái sinh nào
+ORIGINAL_ONLY = 'original_only'
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+
+
+def derivative_name(name, width, ext):
+    root, _ = os.path.splitext(name)
+    return '%s.%dw.%s' % (root, width, ext)
+
+
+def generate_derivatives(field_file, force=False):
+    """Sinh các ảnh phái sinh còn thiếu, trả về số file đã ghi."""
+    if not field_file:
+        return 0
+    storage = field_file.storage
+    written = 0
+    with storage.open(field_file.name, 'rb') as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    for width in WIDTHS:
+        if width >= image.width:
+            break
+        height = round(image.height * width / image.width)
+        resized = None
+        for ext, pil_format, _ in FORMATS:
+            name = derivative_name(field_file.name, width, ext)
+            if not force and storage.exists(name):
+                continue
+            if resized is None:
+                resized = image.resize((width, height), Image.LANCZOS)
+            output = resized if pil_format == 'WEBP' else resized.convert('RGB')
+            with storage.open(name, 'wb') as target:
+                output.save(target, pil_format, quality=82)
+            written += 1
+    widths = _scan(field_file)
+    if image.width <= WIDTHS[0]:
+        # Ảnh nhỏ hơn bề rộng nhỏ nhất: nhớ rằng không có gì để sinh, lưu ảnh
+        # sau hay cache hết hạn ngắn cũng không xếp lại việc này
+        widths[ORIGINAL_ONLY] = True
+    cache.set(_widths_key(field_file.name), widths, GRID_TIMEOUT)
+    return written
+
+
+def _widths_key(name):
+    return 'store:derivatives:%s' % hashlib.md5(name.encode()).hexdigest()
+
+
+def _scan(field_file):
+    storage = field_file.storage
+    widths = {}
+    for ext, _, _ in FORMATS:
+        widths[ext] = []
+        for width in WIDTHS:
+            if not storage.exists(derivative_name(field_file.name, width, ext)):
+                break
+            widths[ext].append(width)
+    return widths
+
+
+def available_widths(field_file):
+    """``{ext: [bề rộng, ...]}`` của các ảnh phái sinh đã có, đọc từ cache."""
+    key = _widths_key(field_file.name)
+    widths = cache.get(key)
+    if widths is None:
+        widths = _scan(field_file)
+        cache.set(key, widths, GRID_TIMEOUT if any(widths.values()) else MISSING_TIMEOUT)
+    return widths
+
+
+def has_derivatives(field_file):
+    return bool(field_file) and bool(available_widths(field_file)[FORMATS[0][0]])
+
+
+def needs_derivatives(field_file):
+    """Ảnh chưa có phái sinh và cũng chưa được biết là quá nhỏ để có."""
+    if not field_file:
+        return False
+    widths = available_widths(field_file)
+    return not widths[FORMATS[0][0]] and not widths.get(ORIGINAL_ONLY)
+
+
+def schedule_derivatives(field_file):
+    """Sinh ảnh phái sinh ở luồng nền để không chặn request upload."""
+    def run():
+        try:
+            if generate_derivatives(field_file):
+                # Lưới sản phẩm đã cache cần render lại để có srcset mới
+                bump_generation()
+        except Exception:
+            logger.exception('Không sinh được ảnh phái sinh cho %s', field_file.name)
+    _executor.submit(run)
+
+
+def srcset(field_file, ext):
+    """Các cặp ``(url, width)`` đã có sẵn cho định dạng ``ext``."""
+    if not field_file:
+        return []
+    storage = field_file.storage
+    return [
+        (storage.url(derivative_name(field_file.name, width, ext)), width)
+        for width in available_widths(field_file).get(ext, ())
+    ]
@@ -0,0 +1,172 @@
+"""Giữ hàng (reservation) cho giờ cao điểm / flash sale.
+
+Khi ``STOCK_RESERVATION`` bật, thêm vào giỏ sẽ trừ ngay tồn kho bằng một câu
+``UPDATE ... WHERE stock >= n`` (không đọc rồi ghi nên không có race) và ghi
+một StockReservation có hạn. Đặt hàng dùng lại phần đã giữ; phần hết hạn được
+trả về kho bởi ``manage.py sweep_reservations``.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+
+from . import metrics
+from .models import Phone, StockReservation
+
+STATS_KEYS = ('reserved', 'rejected', 'released', 'expired')
+STATS_STARTED_KEY = 'store:reservations:started'
+
+
+def enabled():
+    return settings.STOCK_RESERVATION
+
+
+def _counter(name):
+    return 'store_reservations_%s_total' % name
+
+
+def _count(name, amount=1):
+    cache.add(STATS_STARTED_KEY, time.time(), timeout=None)
+    metrics.increment(_counter(name), amount)
+
+
+def _restock(quantities):
+    """Cộng lại tồn kho cho ``{phone_id: số lượng}`` trong một câu UPDATE."""
+    if not quantities:
+        return
+    Phone.objects.filter(pk__in=quantities).update(
+        stock=Case(*[When(pk=pk, then=F('stock') + quantity) for pk, quantity in quantities.items()]),
+        updated_at=timezone.now(),
+    )
+
+
+def reserve(user, phone_id, quantity=1):
+    """Giữ ``quantity`` sản phẩm, trả về StockReservation hoặc None nếu hết hàng."""
+    with transaction.atomic():
+        taken = Phone.objects.filter(pk=phone_id, stock__gte=quantity).update(
+            stock=F('stock') - quantity,
+            updated_at=timezone.now(),
+        )
+        if not taken:
+            _count('rejected')
+            return None
+        reservation = StockReservation.objects.create(
+            phone_id=phone_id,
+            user=user,
+            quantity=quantity,
+            expires_at=timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL),
+        )
+    _count('reserved')
+    return reservation
+
+
+def set_reserved(user, phone_id, quantity):
+    """Đưa phần đang giữ của người dùng cho một sản phẩm về đúng ``quantity``.
+
+    Chỉ phần chênh lệch được trừ (``UPDATE ... WHERE stock >= chênh lệch``)
+    hoặc cộng lại kho, trong cùng transaction, nên phần đã giữ không bao giờ
+    bị nhả ra giữa chừng. Trả về False nếu không đủ hàng cho phần tăng thêm;
+    khi đó phần đang giữ được giữ nguyên.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(user=user, phone_id=phone_id)
+        held = reservations.aggregate(total=Sum('quantity'))['total'] or 0
+        delta = quantity - held
+        if delta > 0:
+            taken = Phone.objects.filter(pk=phone_id, stock__gte=delta).update(
+                stock=F('stock') - delta,
+                updated_at=now,
+            )
+            if not taken:
+                _count('rejected')
+                return False
+        elif delta < 0:
+            _restock({phone_id: -delta})
+        # Gộp thành một reservation và gia hạn TTL
+        reservations.delete()
+        if quantity > 0:
+            StockReservation.objects.create(
+                phone_id=phone_id,
+                user=user,
+                quantity=quantity,
+                expires_at=now + timedelta(seconds=settings.STOCK_RESERVATION_TTL),
+            )
+    if delta > 0:
+        _count('reserved')
+    elif delta < 0:
+        _count('released')
+    return True
+
+
+def release(user, phone_id):
+    """Trả lại kho toàn bộ phần đang giữ của người dùng cho một sản phẩm."""
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(user=user, phone_id=phone_id)
+        quantity = reservations.aggregate(total=Sum('quantity'))['total']
+        if not quantity:
+            return 0
+        reservations.delete()
+        _restock({phone_id: quantity})
+    _count('released')
+    return quantity
+
+
+def consume(user):
+    """Lấy và xoá phần đang giữ còn hạn của người dùng, trả về ``{phone_id: số lượng}``.
+
+    Phải được gọi bên trong transaction đặt hàng.
+    """
+    quantities = defaultdict(int)
+    rows = StockReservation.objects.select_for_update().filter(user=user, expires_at__gte=timezone.now())
+    ids = []
+    for pk, phone_id, quantity in rows.values_list('pk', 'phone_id', 'quantity'):
+        ids.append(pk)
+        quantities[phone_id] += quantity
+    if ids:
+        StockReservation.objects.filter(pk__in=ids).delete()
+    return dict(quantities)
+
+
+def sweep_expired(batch_size=500):
+    """Trả lại kho các phần giữ đã hết hạn, trả về số reservation đã xử lý."""
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lt=timezone.now())
+                .order_by('expires_at')
+                .values_list('pk', 'phone_id', 'quantity')[:batch_size]
+            )
+            if not rows:
+                break
+            quantities = defaultdict(int)
+            for _, phone_id, quantity in rows:
+                quantities[phone_id] += quantity
+            StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            _restock(quantities)
+        total += len(rows)
+        _count('expired', len(rows))
+    return total
+
+
+def reservation_stats():
+    values = metrics.read_counters([_counter(name) for name in STATS_KEYS])
+    stats = {name: values[_counter(name)] for name in STATS_KEYS}
+    attempts = stats['reserved'] + stats['rejected']
+    started = cache.get(STATS_STARTED_KEY)
+    elapsed = time.time() - started if started else 0
+    stats['reject_rate'] = stats['rejected'] / attempts if attempts else 0.0
+    stats['reserved_per_second'] = stats['reserved'] / elapsed if elapsed else 0.0
+    return stats
+
+
+def reset_stats():
+    metrics.reset_counters([_counter(name) for name in STATS_KEYS])
+    cache.delete(STATS_STARTED_KEY)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from store.cache import bump_generation
+from store.images import generate_derivatives
+from store.models import Brand, Phone, Profile
+
+
+class Command(BaseCommand):
+    help = 'Sinh ảnh thu nhỏ WebP/JPEG còn thiếu cho ảnh sản phẩm, logo và avatar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Sinh lại cả ảnh đã có')
+
+    def handle(self, *args, **options):
+        sources = (
+            (Phone, 'image'),
+            (Brand, 'logo'),
+            (Profile, 'avatar'),
+        )
+        total = 0
+        for model, field in sources:
+            queryset = model.objects.exclude(**{field: ''}).exclude(**{'%s__isnull' % field: True})
+            for obj in queryset.only('pk', field).iterator():
+                try:
+                    total += generate_derivatives(getattr(obj, field), force=options['force'])
+                except (OSError, ValueError) as exc:
+                    self.stderr.write('%s #%s: %s' % (model.__name__, obj.pk, exc))
+        if total:
+            bump_generation()
+        self.stdout.write(self.style.SUCCESS('Đã ghi %d ảnh phái sinh.' % total))
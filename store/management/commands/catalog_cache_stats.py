@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store.cache import get_generation, grid_stats, reset_grid_stats
+
+
+class Command(BaseCommand):
+    help = 'Hiển thị số lần hit/miss của cache lưới sản phẩm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Đặt lại bộ đếm sau khi in')
+
+    def handle(self, *args, **options):
+        stats = grid_stats()
+        self.stdout.write('generation: %s' % get_generation())
+        self.stdout.write('hits: %(hits)d  misses: %(misses)d  hit ratio: %(hit_ratio).1f%%' % {
+            **stats,
+            'hit_ratio': stats['hit_ratio'] * 100,
+        })
+        if options['reset']:
+            reset_grid_stats()
+            self.stdout.write('Đã đặt lại bộ đếm.')
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from store import metrics
+from store.models import Brand, Phone
+
+BEFORE = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Đo số câu ghi CSDL và số lần đọc/ghi django_session mỗi request với cấu hình '
+        'session/messages mặc định của Django so với cấu hình hiện tại. '
+        'Mọi thay đổi CSDL đều được rollback; cache và số liệu dùng bản tạm riêng.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Số lần xem trang sau khi đăng nhập')
+
+    def handle(self, *args, **options):
+        # Cache và file số liệu tạm: generation của danh mục, session và bộ đếm
+        # của lần đo không lẫn vào dữ liệu thật (CSDL thì rollback được, cache thì không)
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'session-probe-%s' % uuid.uuid4().hex,
+            }},
+            METRICS_DB_PATH=os.path.join(directory, 'metrics.sqlite3'),
+        ):
+            self._compare(options['requests'])
+            metrics.buffer.flush()
+
+    def _compare(self, pages):
+        self.stdout.write('%-36s %8s %12s %14s %14s' % (
+            'cấu hình', 'request', 'ghi/request', 'đọc session', 'ghi session',
+        ))
+        with override_settings(**BEFORE):
+            self._report('trước (db + FallbackStorage)', pages)
+        self._report('sau (%s + %s)' % (
+            settings.SESSION_STORE, settings.MESSAGE_STORAGE.rsplit('.', 1)[-1],
+        ), pages)
+
+    def _report(self, label, pages):
+        username = 'session-probe-%s' % uuid.uuid4().hex[:12]
+        with transaction.atomic():
+            User.objects.create_user(username, password='session-probe-pw')
+            brand = Brand.objects.create(name='Session probe')
+            phone = Phone.objects.create(name='Session probe', brand=brand, description='', price=1, stock=1)
+            client = Client()
+            with CaptureQueriesContext(connection) as queries:
+                requests = [
+                    ('post', '/login/', {'username': username, 'password': 'session-probe-pw'}),
+                    ('post', '/add-to-cart/%d/' % phone.pk, {}),
+                ]
+                requests += [('get', '/', {}), ('get', '/brands/', {})] * (pages // 2)
+                for method, url, data in requests:
+                    getattr(client, method)(url, data)
+            transaction.set_rollback(True)
+
+        statements = [q['sql'] for q in queries.captured_queries]
+        writes = [sql for sql in statements if sql.split(' ', 1)[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        session_reads = [sql for sql in statements if sql.startswith('SELECT') and 'django_session' in sql]
+        session_writes = [sql for sql in writes if 'django_session' in sql]
+        self.stdout.write('%-36s %8d %12.2f %14.2f %14.2f' % (
+            label,
+            len(requests),
+            len(writes) / len(requests),
+            len(session_reads) / len(requests),
+            len(session_writes) / len(requests),
+        ))
@@ -0,0 +1,47 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from store.notifications import get_backend, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Gửi thông báo trong outbox theo từng lô, thử lại khi lỗi'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--lease', type=int, default=60, help='Số giây giữ một lô trước khi worker khác được nhận lại')
+        parser.add_argument('--interval', type=float, default=5, help='Số giây chờ khi outbox trống')
+        parser.add_argument('--once', action='store_true', help='Xử lý các thông báo đến hạn rồi thoát')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        owner = '%s-%d' % (socket.gethostname(), os.getpid())
+        total_sent = total_failed = 0
+        try:
+            while True:
+                try:
+                    sent, failed = process_batch(options['batch_size'], options['lease'], backend, owner)
+                except DatabaseError as exc:
+                    # Lỗi tạm thời (database is locked...) không được làm dừng worker;
+                    # start.sh sẽ dừng cả web nếu worker thoát
+                    if options['once']:
+                        raise
+                    self.stderr.write('Lỗi cơ sở dữ liệu: %s' % exc)
+                    close_old_connections()
+                    time.sleep(options['interval'])
+                    continue
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write('Đã gửi %d, lỗi %d.' % (sent, failed))
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Tổng cộng: đã gửi %d, lỗi %d.' % (total_sent, total_failed)))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.cache import bump_generation
+from store.directory import rebuild_brand_summaries
+
+
+class Command(BaseCommand):
+    help = 'Tính lại số sản phẩm và khoảng giá của mọi thương hiệu'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_brand_summaries()
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS('Đã cập nhật %d thương hiệu.' % total))
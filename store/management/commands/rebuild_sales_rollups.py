@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from store.reports import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng tổng hợp doanh số theo ngày từ các đơn hàng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Từ ngày (YYYY-MM-DD), mặc định là toàn bộ')
+        parser.add_argument('--until', help='Đến ngày (YYYY-MM-DD), mặc định là toàn bộ')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('since', 'until'):
+            if options[name]:
+                try:
+                    dates[name] = parse_date(options[name])
+                except ValueError:
+                    dates[name] = None
+                if dates[name] is None:
+                    raise CommandError('Ngày không hợp lệ: %s' % options[name])
+        total = rebuild(**dates)
+        self.stdout.write(self.style.SUCCESS('Đã tạo %d dòng tổng hợp.' % total))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại chỉ mục tìm kiếm toàn văn (FTS5) cho sản phẩm'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stderr.write('CSDL hiện tại không phải SQLite, bỏ qua.')
+            return
+        total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Đã index %d sản phẩm.' % total))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.db import refresh_stats
+
+
+class Command(BaseCommand):
+    help = 'Chạy ANALYZE để cập nhật sqlite_stat1 (query planner và số dòng ước lượng của admin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        refresh_stats(options['database'])
+        self.stdout.write(self.style.SUCCESS('Đã cập nhật thống kê SQLite.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from store.inventory import reservation_stats, reset_stats, sweep_expired
+
+
+class Command(BaseCommand):
+    help = 'Trả lại kho các reservation đã hết hạn và in thống kê giữ hàng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--reset-stats', action='store_true', help='Đặt lại bộ đếm sau khi in')
+
+    def handle(self, *args, **options):
+        expired = sweep_expired(batch_size=options['batch_size'])
+        stats = reservation_stats()
+        self.stdout.write('Đã trả lại kho %d reservation hết hạn.' % expired)
+        self.stdout.write(
+            'reserved: %(reserved)d  rejected: %(rejected)d  released: %(released)d  expired: %(expired)d' % stats
+        )
+        self.stdout.write('reject rate: %.1f%%  throughput: %.2f reservation/s' % (
+            stats['reject_rate'] * 100, stats['reserved_per_second'],
+        ))
+        if options['reset_stats']:
+            reset_stats()
@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from store.cache import bump_generation
+
+
+class Command(BaseCommand):
+    help = 'Chép CSDL primary sang read replica bằng SQLite online backup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024, help='Số trang chép mỗi bước')
+
+    def handle(self, *args, **options):
+        if 'replica' not in settings.DATABASES:
+            raise CommandError('Chưa cấu hình replica (đặt biến môi trường REPLICA_DB_PATH).')
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replica chỉ hỗ trợ SQLite.')
+        # Đóng kết nối replica của tiến trình này để không giữ khoá trong lúc chép
+        connections['replica'].close()
+        source = sqlite3.connect(str(settings.DATABASES['default']['NAME']))
+        target = sqlite3.connect(str(settings.DATABASES['replica']['NAME']))
+        try:
+            with target:
+                source.backup(target, pages=options['pages'])
+        finally:
+            target.close()
+            source.close()
+        # Fragment HTML dựng từ replica cũ phải được dựng lại
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS('Đã đồng bộ replica: %s' % settings.DATABASES['replica']['NAME']))
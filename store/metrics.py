@@ -0,0 +1,272 @@
+"""Đo số truy vấn SQL, thời gian CSDL, template và tổng thời gian của từng view.
+
+``MetricsMiddleware`` gắn ``execute_wrapper`` vào mọi kết nối CSDL và đo
+thời gian render template trong lúc xử lý request, rồi ghi vào histogram
+theo tên URL. Số liệu được gom trong bộ nhớ của tiến trình và định kỳ cộng
+dồn vào một file SQLite (``settings.METRICS_DB_PATH``) để mọi worker
+gunicorn cùng chia sẻ; ``/metrics`` đọc file đó và trả về định dạng text của
+Prometheus.
+
+Các bộ đếm (``increment``) như hit/miss của cache lưới hay số lần giữ hàng
+đi cùng đường ghi đó: ``value = value + n`` trong SQLite là nguyên tử giữa
+các tiến trình, khác với ``incr()`` của FileBasedCache (đọc rồi ghi lại).
+"""
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+HISTOGRAMS = {
+    'store_request_duration_seconds': ('Tổng thời gian xử lý request', LATENCY_BUCKETS),
+    'store_db_duration_seconds': ('Thời gian chạy truy vấn SQL trong một request', LATENCY_BUCKETS),
+    'store_template_duration_seconds': ('Thời gian render template trong một request', LATENCY_BUCKETS),
+    'store_db_queries': ('Số truy vấn SQL trong một request', QUERY_BUCKETS),
+}
+COUNTERS = {
+    'store_grid_cache_hits_total': 'Số lần lưới sản phẩm được lấy từ cache',
+    'store_grid_cache_misses_total': 'Số lần lưới sản phẩm phải render lại',
+    'store_reservations_reserved_total': 'Số lần giữ hàng thành công',
+    'store_reservations_rejected_total': 'Số lần giữ hàng bị từ chối vì hết hàng',
+    'store_reservations_released_total': 'Số lần trả lại phần đang giữ',
+    'store_reservations_expired_total': 'Số reservation hết hạn được trả lại kho',
+}
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('store_request_metrics', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'template_time', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+
+class MetricsBuffer:
+    """Các mẫu chưa ghi xuống file, khoá theo (metric, view, le)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._last_flush = time.monotonic()
+
+    def observe(self, metric, view, value):
+        buckets = HISTOGRAMS[metric][1]
+        with self._lock:
+            for le in buckets:
+                if value <= le:
+                    self._add((metric + '_bucket', view, str(le)), 1)
+            self._add((metric + '_bucket', view, '+Inf'), 1)
+            self._add((metric + '_sum', view, ''), value)
+            self._add((metric + '_count', view, ''), 1)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._add((name, '', ''), amount)
+
+    def discard(self, names):
+        with self._lock:
+            for name in names:
+                self._samples.pop((name, '', ''), None)
+
+    def _add(self, key, value):
+        self._samples[key] = self._samples.get(key, 0) + value
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+    def flush(self):
+        with self._lock:
+            samples, self._samples = self._samples, {}
+            self._last_flush = time.monotonic()
+        if not samples:
+            return
+        try:
+            with _open_store() as db:
+                db.executemany(
+                    'INSERT INTO metric (name, view, le, value) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (name, view, le) DO UPDATE SET value = value + excluded.value',
+                    [key + (value,) for key, value in samples.items()],
+                )
+        except sqlite3.Error:
+            logger.exception('Không ghi được số liệu vào %s', settings.METRICS_DB_PATH)
+
+
+buffer = MetricsBuffer()
+atexit.register(buffer.flush)
+
+
+def _open_store():
+    db = sqlite3.connect(str(settings.METRICS_DB_PATH), timeout=5)
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS metric ('
+        'name TEXT NOT NULL, view TEXT NOT NULL, le TEXT NOT NULL, value REAL NOT NULL, '
+        'PRIMARY KEY (name, view, le))'
+    )
+    return db
+
+
+def increment(name, amount=1):
+    """Cộng vào bộ đếm ``name`` (một khoá của ``COUNTERS``)."""
+    buffer.count(name, amount)
+    if buffer.flush_due():
+        buffer.flush()
+
+
+def read_counters(names):
+    """``{name: giá trị}`` đã cộng dồn của mọi worker."""
+    buffer.flush()
+    values = {}
+    try:
+        with _open_store() as db:
+            values = dict(db.execute(
+                "SELECT name, value FROM metric WHERE view = '' AND le = '' AND name IN (%s)"
+                % ', '.join('?' * len(names)),
+                list(names),
+            ).fetchall())
+    except sqlite3.Error:
+        logger.exception('Không đọc được số liệu từ %s', settings.METRICS_DB_PATH)
+    return {name: int(values.get(name, 0)) for name in names}
+
+
+def reset_counters(names):
+    buffer.discard(names)
+    try:
+        with _open_store() as db:
+            db.execute(
+                "DELETE FROM metric WHERE view = '' AND le = '' AND name IN (%s)" % ', '.join('?' * len(names)),
+                list(names),
+            )
+    except sqlite3.Error:
+        logger.exception('Không ghi được số liệu vào %s', settings.METRICS_DB_PATH)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries += 1
+
+
+def instrument_templates():
+    """Bọc ``Template.render``; chỉ lần render ngoài cùng được tính giờ."""
+    from django.template.base import Template
+
+    if getattr(Template.render, 'store_metrics', False):
+        return
+    original = Template.render
+
+    def render(self, context):
+        stats = _current.get()
+        if stats is None or stats.template_depth:
+            return original(self, context)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            stats.template_depth -= 1
+            stats.template_time += time.perf_counter() - start
+
+    render.store_metrics = True
+    Template.render = render
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        # Response dạng stream: chỉ tính tới lúc view trả về, không gồm phần thân
+        self.record(request, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, stats, duration):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else UNRESOLVED
+        buffer.observe('store_request_duration_seconds', view, duration)
+        buffer.observe('store_db_duration_seconds', view, stats.db_time)
+        buffer.observe('store_template_duration_seconds', view, stats.template_time)
+        buffer.observe('store_db_queries', view, stats.queries)
+        budget = settings.METRICS_QUERY_BUDGET
+        if budget and stats.queries > budget:
+            logger.warning(
+                'View %s chạy %d truy vấn (ngân sách %d) trong %.0f ms: %s',
+                view, stats.queries, budget, duration * 1000, request.get_full_path(),
+            )
+        if buffer.flush_due():
+            buffer.flush()
+
+
+def _format_value(value):
+    return '%d' % value if value == int(value) else repr(value)
+
+
+def render_prometheus():
+    """Gộp số liệu của mọi worker thành định dạng text của Prometheus."""
+    buffer.flush()
+    try:
+        with _open_store() as db:
+            rows = db.execute('SELECT name, view, le, value FROM metric').fetchall()
+    except sqlite3.Error:
+        logger.exception('Không đọc được số liệu từ %s', settings.METRICS_DB_PATH)
+        rows = []
+    samples = {}
+    for name, view, le, value in rows:
+        samples[(name, view, le)] = value
+    views = sorted({view for _, view, _ in samples})
+    lines = []
+    for metric, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append('# HELP %s %s' % (metric, help_text))
+        lines.append('# TYPE %s histogram' % metric)
+        for view in views:
+            if (metric + '_count', view, '') not in samples:
+                continue
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            for le in [str(b) for b in buckets] + ['+Inf']:
+                lines.append('%s_bucket{view="%s",le="%s"} %s' % (
+                    metric, label, le, _format_value(samples.get((metric + '_bucket', view, le), 0)),
+                ))
+            lines.append('%s_sum{view="%s"} %s' % (
+                metric, label, _format_value(samples[(metric + '_sum', view, '')]),
+            ))
+            lines.append('%s_count{view="%s"} %s' % (
+                metric, label, _format_value(samples[(metric + '_count', view, '')]),
+            ))
+    for name, help_text in COUNTERS.items():
+        if (name, '', '') in samples:
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s counter' % name)
+            lines.append('%s %s' % (name, _format_value(samples[(name, '', '')])))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,46 @@
+import unicodedata
+
+from django.db import migrations
+
+
+def fold(text):
+    # Bản sao của store.search.fold tại thời điểm tạo migration
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS store_phone_fts "
+        "USING fts5(name, description, brand, tokenize='unicode61 remove_diacritics 2')"
+    )
+    Phone = apps.get_model('store', 'Phone')
+    rows = [
+        (phone.pk, fold(phone.name), fold(phone.description), fold(phone.brand.name))
+        for phone in Phone.objects.using(schema_editor.connection.alias).select_related('brand')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO store_phone_fts (rowid, name, description, brand) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS store_phone_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    from django.db.models import Count, Max, Min, Q
+
+    Brand = apps.get_model('store', 'Brand')
+    BrandSummary = apps.get_model('store', 'BrandSummary')
+    db_alias = schema_editor.connection.alias
+    summaries = []
+    for brand in Brand.objects.using(db_alias).annotate(
+        phone_count=Count('phone'),
+        available_count=Count('phone', filter=Q(phone__available=True)),
+        min_price=Min('phone__price'),
+        max_price=Max('phone__price'),
+    ):
+        summaries.append(BrandSummary(
+            brand=brand,
+            phone_count=brand.phone_count,
+            available_count=brand.available_count,
+            min_price=brand.min_price,
+            max_price=brand.max_price,
+        ))
+    BrandSummary.objects.using(db_alias).bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_phone_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandSummary',
+            fields=[
+                ('brand', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='store.brand')),
+                ('phone_count', models.PositiveIntegerField(default=0)),
+                ('available_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    from django.db.models import Count, Min, Sum
+
+    Cart = apps.get_model('store', 'Cart')
+    db_alias = schema_editor.connection.alias
+    duplicates = (
+        Cart.objects.using(db_alias).values('user_id', 'phone_id')
+        .annotate(lines=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        Cart.objects.using(db_alias).filter(pk=row['keep']).update(quantity=row['quantity'])
+        Cart.objects.using(db_alias).filter(user_id=row['user_id'], phone_id=row['phone_id']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'phone'), name='store_cart_unique_user_phone'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_cart_unique_user_phone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='phone',
+            name='brand',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='store.brand'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='store_order_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at'], name='store_order_created'),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['brand', '-id'], name='store_phone_brand_id'),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(condition=models.Q(('available', True)), fields=['-id'], name='store_phone_available_id'),
+        ),
+    ]
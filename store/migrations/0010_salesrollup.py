@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Tính bảng tổng hợp từ các đơn không bị huỷ đã có (như ``reports.rebuild``)."""
+    from django.db.models import Count, F, Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+
+    OrderItem = apps.get_model('store', 'OrderItem')
+    SalesRollup = apps.get_model('store', 'SalesRollup')
+    alias = schema_editor.connection.alias
+    rows = (
+        OrderItem.objects.using(alias)
+        .exclude(order__status='cancelled')
+        .annotate(day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'product_id')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('price')),
+            order_count=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    SalesRollup.objects.using(alias).bulk_create([
+        SalesRollup(
+            day=row['day'], phone_id=row['product_id'],
+            units=row['units'], revenue=row['revenue'], order_count=row['order_count'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('phone', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='store.phone')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['phone', 'day'], name='store_salesrollup_phone_day')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'phone'), name='store_salesrollup_unique_day_phone')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,39 +1,98 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.contrib import messages
 
 class Brand(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)  # Added back
     logo = models.ImageField(upload_to='brands/', blank=True)  # Added back
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
 
 class Phone(models.Model):
     name = models.CharField(max_length=200)
-    brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
+    # Chỉ mục (brand, -id) ở Meta thay cho chỉ mục mặc định của khoá ngoại
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, db_index=False)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
     available = models.BooleanField(default=True)
     image = models.ImageField(upload_to='phones/')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['brand', '-id'], name='store_phone_brand_id'),
+            # SQLite so khớp bộ lọc boolean dạng `WHERE "available"` với điều kiện của partial index
+            models.Index(fields=['-id'], condition=models.Q(available=True), name='store_phone_available_id'),
+        ]
 
     def __str__(self):
         return self.name
 
+class CatalogVersion(models.Model):
+    """Một dòng duy nhất, tăng mỗi khi Phone/Brand thay đổi; dùng cho ETag/Last-Modified"""
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def bump(cls):
+        now = timezone.now()
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1, updated_at=now):
+            cls.objects.get_or_create(pk=1, defaults={'version': 1, 'updated_at': now})
+
+    @classmethod
+    def current(cls):
+        state = cls.objects.filter(pk=1).first()
+        return state or cls(pk=1, version=0, updated_at=timezone.now().replace(microsecond=0))
+
+class BrandSummary(models.Model):
+    """Thống kê của thương hiệu, được cập nhật khi Phone thay đổi (xem store.directory)"""
+    brand = models.OneToOneField(Brand, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    phone_count = models.PositiveIntegerField(default=0)
+    available_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.brand_id}: {self.phone_count} sản phẩm'
+
 class Cart(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Ràng buộc unique (user, phone) đã là chỉ mục cho Cart.filter(user=...)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     phone = models.ForeignKey(Phone, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     date_added = models.DateTimeField(auto_now_add=True)  # Added back
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'phone'], name='store_cart_unique_user_phone'),
+        ]
+
     @property
     def total_price(self):
         return self.quantity * self.phone.price
 
+class StockReservation(models.Model):
+    """Số lượng đã trừ khỏi Phone.stock cho giỏ hàng, hết hạn sau một khoảng TTL"""
+    phone = models.ForeignKey(Phone, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'phone'], name='store_reservation_user_phone'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity}x {self.phone_id} cho {self.user_id}'
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Đang chờ xử lý'),
@@ -50,7 +109,7 @@ class Order(models.Model):
         ('vnpay', 'VNPay'),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     full_name = models.CharField(max_length=100)
     phone = models.CharField(max_length=15)
     address = models.TextField()
@@ -64,21 +123,38 @@ class Order(models.Model):
         verbose_name = 'Đơn hàng'
         verbose_name_plural = 'Đơn hàng'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='store_order_user_created'),
+            models.Index(fields=['-created_at'], name='store_order_created'),
+            # Trang quản lý đơn hàng: lọc theo trạng thái, phân trang keyset theo id
+            models.Index(fields=['status', '-id'], name='store_order_status_id'),
+        ]
 
     def __str__(self):
         return f'Đơn hàng #{self.id} - {self.full_name}'
 
+    STATUS_NOTIFICATIONS = {
+        'pending': 'đang chờ xử lý',
+        'processing': 'đang được xử lý',
+        'shipped': 'đang được giao',
+        'completed': 'đã giao thành công',
+        'cancelled': 'đã bị hủy'
+    }
+
+    def status_notification(self, status=None):
+        """Tạo (chưa lưu) thông báo trạng thái để ghi vào outbox"""
+        status = status or self.status
+        return NotificationOutbox(
+            order_id=self.id,
+            user_id=self.user_id,
+            message=f'Đơn hàng #{self.id} của bạn {self.STATUS_NOTIFICATIONS.get(status)}',
+        )
+
     def send_status_notification(self):
-        """Gửi thông báo khi cập nhật trạng thái đơn hàng"""
-        status_messages = {
-            'pending': 'đang chờ xử lý',
-            'processing': 'đang được xử lý',
-            'shipped': 'đang được giao',
-            'completed': 'đã giao thành công',
-            'cancelled': 'đã bị hủy'
-        }
-        message = f'Đơn hàng #{self.id} của bạn {status_messages.get(self.status)}'
-        messages.info(self.user, message)
+        """Xếp thông báo vào outbox; gửi thật do `manage.py notification_worker` đảm nhận"""
+        notification = self.status_notification()
+        notification.save()
+        return notification
 
 class Profile(models.Model):  
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -89,6 +165,32 @@ class Profile(models.Model):
     def __str__(self):
         return self.user.username
 
+class NotificationOutbox(models.Model):
+    """Thông báo chờ gửi, được ghi cùng transaction với thay đổi trạng thái đơn hàng"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)  # lần thử tiếp theo
+    leased_until = models.DateTimeField(null=True, blank=True)
+    lease_owner = models.CharField(max_length=64, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['available_at'],
+                condition=models.Q(sent_at__isnull=True, failed_at__isnull=True),
+                name='store_outbox_pending',
+            ),
+        ]
+
+    def __str__(self):
+        return f'#{self.id} cho {self.user_id}: {self.message}'
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Phone, on_delete=models.CASCADE)
@@ -96,4 +198,26 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
-        return f'{self.quantity}x {self.product.name}'
\ No newline at end of file
+        return f'{self.quantity}x {self.product.name}'
+
+class SalesRollup(models.Model):
+    """Doanh số theo ngày × sản phẩm, cập nhật dần khi đặt/huỷ đơn (xem store.reports).
+
+    Không lưu thương hiệu: sản phẩm có thể đổi thương hiệu, báo cáo JOIN qua phone khi đọc.
+    """
+    day = models.DateField()
+    phone = models.ForeignKey(Phone, on_delete=models.CASCADE, db_index=False)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'phone'], name='store_salesrollup_unique_day_phone'),
+        ]
+        indexes = [
+            models.Index(fields=['phone', 'day'], name='store_salesrollup_phone_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.phone_id}: {self.units} x, {self.revenue}'
@@ -0,0 +1,122 @@
+"""Gửi thông báo từ outbox bên ngoài request.
+
+Thay đổi trạng thái đơn hàng chỉ ghi một dòng ``NotificationOutbox`` trong
+cùng transaction. ``manage.py notification_worker`` nhận (claim) từng lô
+bằng lease: dòng được giữ tới ``leased_until``, nếu worker chết giữa chừng
+thì lease hết hạn và worker khác nhận lại. Gửi lỗi thì thử lại sau một
+khoảng tăng dần (exponential backoff), quá ``NOTIFICATION_MAX_ATTEMPTS``
+lần thì đánh dấu thất bại.
+"""
+import json
+import logging
+import random
+import sys
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+
+class ConsoleBackend:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, notification):
+        self.stream.write('[thông báo] user=%s order=%s: %s\n' % (
+            notification.user_id, notification.order_id, notification.message,
+        ))
+        self.stream.flush()
+
+
+class FileBackend:
+    """Ghi mỗi thông báo thành một dòng JSON vào ``NOTIFICATION_FILE_PATH``."""
+
+    def __init__(self, path=None):
+        self.path = path or settings.NOTIFICATION_FILE_PATH
+
+    def send(self, notification):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'id': notification.pk,
+                'user_id': notification.user_id,
+                'order_id': notification.order_id,
+                'message': notification.message,
+                'sent_at': timezone.now().isoformat(),
+            }, ensure_ascii=False) + '\n')
+
+
+def get_backend():
+    return import_string(settings.NOTIFICATION_BACKEND)()
+
+
+def retry_delay(attempts):
+    """Thời gian chờ trước lần thử thứ ``attempts + 1``, có jitter để các lỗi không dồn cùng lúc."""
+    delay = min(settings.NOTIFICATION_RETRY_BASE * 2 ** (attempts - 1), settings.NOTIFICATION_RETRY_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def pending():
+    return NotificationOutbox.objects.filter(sent_at__isnull=True, failed_at__isnull=True)
+
+
+def claim(batch_size, lease_seconds, owner=None):
+    """Giữ tối đa ``batch_size`` thông báo đến hạn cho worker ``owner``."""
+    owner = owner or uuid.uuid4().hex
+    now = timezone.now()
+    free = Q(leased_until__isnull=True) | Q(leased_until__lt=now)
+    with transaction.atomic():
+        ids = list(
+            pending().filter(free, available_at__lte=now)
+            .order_by('available_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        # Điều kiện lease lặp lại trong UPDATE nên hai worker không nhận trùng một dòng
+        pending().filter(free, pk__in=ids).update(
+            leased_until=now + timedelta(seconds=lease_seconds),
+            lease_owner=owner,
+        )
+    return list(
+        NotificationOutbox.objects.filter(pk__in=ids, lease_owner=owner, leased_until__gt=now).order_by('pk')
+    )
+
+
+def deliver(notifications, backend=None):
+    """Gửi các thông báo đã claim; trả về (số đã gửi, số lỗi)."""
+    backend = backend or get_backend()
+    sent, failed = [], []
+    for notification in notifications:
+        try:
+            backend.send(notification)
+        except Exception as exc:
+            logger.warning('Gửi thông báo #%s lỗi: %s', notification.pk, exc)
+            failed.append((notification, exc))
+        else:
+            sent.append(notification.pk)
+
+    now = timezone.now()
+    if sent:
+        NotificationOutbox.objects.filter(pk__in=sent).update(
+            sent_at=now, leased_until=None, attempts=F('attempts') + 1,
+        )
+    for notification, exc in failed:
+        attempts = notification.attempts + 1
+        changes = {'attempts': attempts, 'last_error': repr(exc)[:1000], 'leased_until': None}
+        if attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            changes['failed_at'] = now
+        else:
+            changes['available_at'] = now + retry_delay(attempts)
+        NotificationOutbox.objects.filter(pk=notification.pk).update(**changes)
+    return len(sent), len(failed)
+
+
+def process_batch(batch_size=100, lease_seconds=60, backend=None, owner=None):
+    return deliver(claim(batch_size, lease_seconds, owner), backend)
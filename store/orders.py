@@ -0,0 +1,198 @@
+"""Đặt hàng trong một transaction với số truy vấn cố định.
+
+``place_order`` đọc (và khoá) giỏ hàng kèm Phone một lần, tạo Order, tạo
+mọi OrderItem bằng ``bulk_create``, trừ tồn kho bằng một câu ``UPDATE`` có
+điều kiện ``stock >= số lượng`` rồi xoá giỏ hàng. Bất kỳ bước nào lỗi thì
+toàn bộ bị rollback, không có đơn hàng dở dang.
+
+``bulk_transition`` chuyển trạng thái nhiều đơn cùng lúc theo bảng
+``TRANSITIONS``: một câu ``UPDATE`` có điều kiện trạng thái nguồn và một
+``bulk_create`` các dòng LogEntry và thông báo trong outbox.
+"""
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import inventory, reports
+from .cart import invalidate_cart_count
+from .models import Cart, NotificationOutbox, Order, OrderItem, Phone
+
+
+class OrderError(Exception):
+    pass
+
+
+class EmptyCart(OrderError):
+    pass
+
+
+class OutOfStock(OrderError):
+    def __init__(self, phones):
+        self.phones = phones
+        super().__init__('Không đủ hàng: %s' % ', '.join(phone.name for phone in phones))
+
+
+class InvalidTransition(OrderError):
+    pass
+
+
+# Trạng thái hiện tại -> các trạng thái được phép chuyển tới
+TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'completed'},
+    'completed': set(),
+    'cancelled': set(),
+}
+
+
+def allowed_sources(new_status):
+    return [status for status, targets in TRANSITIONS.items() if new_status in targets]
+
+
+def can_transition(old_status, new_status):
+    return new_status in TRANSITIONS.get(old_status, ())
+
+
+def decrement_stock(quantities):
+    """Trừ tồn kho cho ``{phone_id: số lượng}`` trong một câu UPDATE.
+
+    Số lượng âm nghĩa là cộng trả lại kho. Trả về True nếu mọi sản phẩm đều
+    đủ hàng; nếu không thì người gọi phải rollback transaction.
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+    if not quantities:
+        return True
+    condition = reduce(or_, (
+        Q(pk=pk, stock__gte=quantity) if quantity > 0 else Q(pk=pk)
+        for pk, quantity in quantities.items()
+    ))
+    updated = Phone.objects.filter(condition).update(
+        stock=Case(*[When(pk=pk, then=F('stock') - quantity) for pk, quantity in quantities.items()]),
+        updated_at=timezone.now(),
+    )
+    return updated == len(quantities)
+
+
+def place_order(user, full_name, phone, address, payment_method, order_note=''):
+    with transaction.atomic():
+        lines = list(
+            Cart.objects.select_for_update()
+            .filter(user=user)
+            .select_related('phone')
+            .order_by('id')
+        )
+        if not lines:
+            raise EmptyCart('Giỏ hàng trống')
+
+        quantities = OrderedDict()
+        phones = {}
+        for line in lines:
+            quantities[line.phone_id] = quantities.get(line.phone_id, 0) + line.quantity
+            phones[line.phone_id] = line.phone
+        # Phần đã giữ trước đã được trừ khỏi kho, chỉ trừ phần chênh lệch
+        if inventory.enabled():
+            for pk, quantity in inventory.consume(user).items():
+                quantities[pk] = quantities.get(pk, 0) - quantity
+        short = [phones[pk] for pk, quantity in quantities.items()
+                 if pk in phones and phones[pk].stock < quantity]
+        if short:
+            raise OutOfStock(short)
+
+        order = Order.objects.create(
+            user=user,
+            full_name=full_name,
+            phone=phone,
+            address=address,
+            payment_method=payment_method,
+            order_note=order_note,
+            total=sum(line.quantity * line.phone.price for line in lines),
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=line.phone, quantity=line.quantity, price=line.phone.price)
+            for line in lines
+        ])
+        reports.record_order(order, items)
+        if not decrement_stock(quantities):
+            # Có người mua trước giữa lúc đọc và lúc trừ kho
+            raise OutOfStock(list(phones.values()))
+        Cart.objects.filter(pk__in=[line.pk for line in lines]).delete()
+
+    invalidate_cart_count(user)
+    return order
+
+
+def bulk_transition(order_ids, new_status, user):
+    """Chuyển các đơn hợp lệ trong ``order_ids`` sang ``new_status``.
+
+    Đơn đang ở trạng thái không được phép chuyển sẽ bị bỏ qua. Trả về danh
+    sách id đã được chuyển.
+    """
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition('Trạng thái không hợp lệ: %s' % new_status)
+    sources = allowed_sources(new_status)
+    if not sources:
+        return []
+    labels = dict(Order.STATUS_CHOICES)
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=list(order_ids), status__in=sources)
+            .values_list('pk', 'full_name', 'status', 'user_id')
+        )
+        if not orders:
+            return []
+        changed = [pk for pk, _, _, _ in orders]
+        Order.objects.filter(pk__in=changed, status__in=sources).update(status=new_status)
+        if new_status == 'cancelled':
+            reports.record_cancellations(changed)
+        # Thông báo vào outbox cùng transaction; worker gửi sau khi commit
+        NotificationOutbox.objects.bulk_create([
+            Order(pk=pk, user_id=user_id).status_notification(new_status)
+            for pk, _, _, user_id in orders
+        ])
+        content_type = ContentType.objects.get_for_model(Order)
+        LogEntry.objects.bulk_create([
+            LogEntry(
+                user_id=user.pk,
+                content_type_id=content_type.pk,
+                object_id=str(pk),
+                object_repr=str(Order(pk=pk, full_name=full_name))[:200],
+                action_flag=CHANGE,
+                change_message='Đã thay đổi trạng thái từ %s sang %s' % (labels[old], labels[new_status]),
+            )
+            for pk, full_name, old, _ in orders
+        ])
+    return changed
+
+
+def with_item_totals(queryset):
+    """Thêm ``item_count`` và ``items_total`` bằng subquery, không JOIN/GROUP BY cả bảng đơn hàng."""
+    items = OrderItem.objects.filter(order=OuterRef('pk')).values('order')
+    return queryset.annotate(
+        item_count=Coalesce(
+            Subquery(items.annotate(n=Sum('quantity')).values('n'), output_field=IntegerField()), 0,
+        ),
+        items_total=Coalesce(
+            Subquery(
+                items.annotate(total=Sum(F('quantity') * F('price'))).values('total'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            0, output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+def status_counts(queryset):
+    """``{status: số đơn}`` cho mọi trạng thái, từ một truy vấn GROUP BY."""
+    counts = dict.fromkeys(dict(Order.STATUS_CHOICES), 0)
+    for row in queryset.order_by().values('status').annotate(n=Count('pk')):
+        counts[row['status']] = row['n']
+    return counts
@@ -0,0 +1,174 @@
+"""Phân trang keyset (cursor) cho danh sách sản phẩm.
+
+Thay vì ``OFFSET`` và ``COUNT(*)``, mỗi trang được lấy bằng điều kiện
+``id < last_seen_id`` trên khoá chính nên trang sâu tốn chi phí như trang 1.
+
+``EstimatedCountPaginator`` dành cho changelist của Django admin, nơi vẫn
+cần số trang nhưng không cần tổng số chính xác.
+"""
+import base64
+import binascii
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def encode_cursor(direction, pk):
+    raw = ('%s%d' % (direction, pk)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Trả về ``(direction, pk)`` hoặc ``None`` nếu cursor không hợp lệ."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, pk = raw[0], int(raw[1:])
+    except (binascii.Error, UnicodeDecodeError, ValueError, IndexError):
+        return None
+    if direction not in ('n', 'p') or pk < 1:
+        return None
+    return direction, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page or not self.object_list:
+            return None
+        return encode_cursor('n', self.object_list[-1].pk)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page or not self.object_list:
+            return None
+        return encode_cursor('p', self.object_list[0].pk)
+
+
+class KeysetPaginator:
+    """Phân trang theo khoá chính giảm dần.
+
+    ``count`` là tuỳ chọn: một số nguyên hoặc một hàm trả về tổng số bản ghi
+    (ví dụ lấy từ cache hoặc ước lượng). Paginator không bao giờ tự chạy
+    ``COUNT(*)``.
+    """
+
+    def __init__(self, object_list, per_page, count=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self._count = count
+
+    @property
+    def count(self):
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    def get_page(self, cursor=None):
+        position = decode_cursor(cursor)
+        limit = self.per_page + 1
+        if position is None:
+            rows = list(self.object_list.order_by('-pk')[:limit])
+            return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+        direction, pk = position
+        if direction == 'n':
+            rows = list(self.object_list.filter(pk__lt=pk).order_by('-pk')[:limit])
+            return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
+
+        rows = list(self.object_list.filter(pk__gt=pk).order_by('pk')[:limit])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return KeysetPage(rows, self, True, has_previous)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator không chạy ``COUNT(*)`` trên toàn bảng.
+
+    - Không có bộ lọc: lấy số dòng từ ``sqlite_stat1`` (do ``ANALYZE`` định
+      kỳ cập nhật, xem ``db.refresh_stats``), nếu chưa có thì đếm một lần và
+      cache trong ``COUNT_TIMEOUT`` giây.
+    - Có bộ lọc: chỉ đếm tối đa ``COUNT_CAP`` dòng.
+
+    Số này chỉ để hiển thị: trang vượt quá số trang ước lượng vẫn được đọc
+    bằng LIMIT/OFFSET như thường thay vì báo lỗi.
+    """
+    COUNT_CAP = 10000
+    COUNT_TIMEOUT = 5 * 60
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return queryset[:self.COUNT_CAP].count()
+        table = queryset.model._meta.db_table
+        estimate = self._table_estimate(queryset.db, table)
+        if estimate is not None:
+            return estimate
+        key = 'store:admin-count:%s' % table
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.COUNT_TIMEOUT)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Số trang chỉ là ước lượng, chỉ từ chối số trang nhỏ hơn 1
+            number = int(number)
+            if number < 1:
+                raise
+            return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _table_estimate(self, alias, table):
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            # Chưa từng ANALYZE thì chưa có bảng sqlite_stat1
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT idx, stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            stats = cursor.fetchall()
+            # Chỉ mục một phần (có WHERE) chỉ đếm các dòng thoả điều kiện của nó
+            cursor.execute('PRAGMA index_list(%s)' % connection.ops.quote_name(table))
+            partial = {row[1] for row in cursor.fetchall() if row[4]}
+        # Dòng idx IS NULL là số dòng của bảng; nếu không có thì lấy chỉ mục đầy đủ lớn nhất
+        counts = [
+            int(stat.split()[0]) for idx, stat in stats
+            if stat and (idx is None or idx not in partial)
+        ]
+        return max(counts) if counts else None
@@ -0,0 +1,3 @@
+def is_admin(user):
+    """Quyền vào các trang quản trị riêng của cửa hàng (đơn hàng, báo cáo, số liệu, profile)."""
+    return user.is_superuser or user.is_staff
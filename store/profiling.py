@@ -0,0 +1,195 @@
+"""Profile một request theo yêu cầu của quản trị viên.
+
+Gửi header ``X-Profile: <token>`` hoặc thêm ``?_profile=<token>`` vào URL khi
+đã đăng nhập bằng tài khoản quản trị (``permissions.is_admin``). Token được
+ký cho đúng người dùng và hết hạn sau ``settings.PROFILE_TOKEN_MAX_AGE`` giây
+(lấy ở trang /admin/profiles/), nên một link ``?_profile=1`` do trang khác
+nhúng vào không kích hoạt được profiler. Request đó được chạy dưới
+pyinstrument (nếu đã cài) hoặc cProfile; kết quả được lưu vào
+``settings.PROFILE_DIR`` và chỉ giữ ``settings.PROFILE_KEEP`` bản mới nhất.
+Khi không có trigger, middleware chỉ kiểm tra hai khoá trong dict rồi chuyển
+tiếp request.
+"""
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+from .permissions import is_admin
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+TRIGGER_HEADER = 'HTTP_X_PROFILE'
+TRIGGER_PARAM = '_profile'
+TOKEN_SALT = 'store.profiling'
+TOP_FUNCTIONS = 15
+CAPTURE_NAME = re.compile(r'^[\w-]+\.(prof|html|json)$')
+
+Capture = namedtuple('Capture', 'id path view method duration engine created_at output top')
+
+_sequence = itertools.count()
+
+
+def profile_dir():
+    path = Path(settings.PROFILE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def make_token(user):
+    return signing.dumps(user.pk, salt=TOKEN_SALT)
+
+
+def trigger_token(request):
+    """Token trong header hoặc query string, None nếu request không yêu cầu profile."""
+    if TRIGGER_HEADER in request.META:
+        return request.META[TRIGGER_HEADER]
+    # Chỉ parse query string khi có khả năng chứa tham số
+    if TRIGGER_PARAM in request.META.get('QUERY_STRING', ''):
+        return request.GET.get(TRIGGER_PARAM)
+    return None
+
+
+def token_valid(token, user):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILE_TOKEN_MAX_AGE) == user.pk
+    except signing.BadSignature:
+        return False
+
+
+def _engine():
+    if settings.PROFILER == 'cprofile' or SamplingProfiler is None:
+        return 'cprofile'
+    return 'pyinstrument'
+
+
+def _cprofile_top(profiler):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': '%s (%s:%d)' % (function, os.path.basename(filename), line),
+            'calls': calls,
+            'own': own,
+            'cumulative': cumulative,
+        })
+    rows.sort(key=lambda row: row['cumulative'], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _sampling_top(session):
+    totals = {}
+    stack = [session.root_frame()]
+    while stack:
+        frame = stack.pop()
+        if frame is None:
+            continue
+        key = '%s (%s:%s)' % (frame.function, frame.file_path_short, frame.line_no)
+        row = totals.setdefault(key, {'function': key, 'calls': 0, 'own': 0.0, 'cumulative': 0.0})
+        row['calls'] += 1
+        row['own'] += frame.total_self_time
+        row['cumulative'] += frame.time
+        stack.extend(frame.children)
+    rows = sorted(totals.values(), key=lambda row: row['own'], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def run_profiled(request, get_response):
+    """Chạy request dưới profiler; trả về (response, capture_id)."""
+    engine = _engine()
+    start = time.perf_counter()
+    if engine == 'pyinstrument':
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.stop()
+        output, content = 'html', profiler.output_html()
+        top = _sampling_top(profiler.last_session)
+    else:
+        profiler = cProfile.Profile()
+        try:
+            response = profiler.runcall(get_response, request)
+        finally:
+            profiler.create_stats()
+        output, content = 'prof', None
+        top = _cprofile_top(profiler)
+    duration = time.perf_counter() - start
+
+    capture_id = '%d-%d-%d' % (time.time() * 1000, os.getpid(), next(_sequence))
+    directory = profile_dir()
+    if content is None:
+        profiler.dump_stats(directory / ('%s.prof' % capture_id))
+    else:
+        (directory / ('%s.html' % capture_id)).write_text(content, encoding='utf-8')
+    match = request.resolver_match
+    (directory / ('%s.json' % capture_id)).write_text(json.dumps({
+        'path': request.get_full_path(),
+        'view': match.view_name if match else None,
+        'method': request.method,
+        'duration': duration,
+        'engine': engine,
+        'created_at': time.time(),
+        'output': '%s.%s' % (capture_id, output),
+        'top': top,
+    }), encoding='utf-8')
+    prune()
+    return response, capture_id
+
+
+def prune():
+    """Chỉ giữ PROFILE_KEEP bản ghi mới nhất."""
+    directory = profile_dir()
+    captures = sorted(directory.glob('*.json'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for meta in captures[settings.PROFILE_KEEP:]:
+        for path in directory.glob('%s.*' % meta.stem):
+            path.unlink(missing_ok=True)
+
+
+def list_captures():
+    captures = []
+    for meta in profile_dir().glob('*.json'):
+        try:
+            data = json.loads(meta.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        captures.append(Capture(id=meta.stem, **data))
+    captures.sort(key=lambda capture: capture.created_at, reverse=True)
+    return captures
+
+
+def capture_file(name):
+    """Đường dẫn tới file kết quả, hoặc None nếu tên không hợp lệ/không tồn tại."""
+    if not CAPTURE_NAME.match(name):
+        return None
+    path = profile_dir() / name
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+        # Kiểm tra trigger trước để request thường không phải tải request.user
+        token = trigger_token(request)
+        if not (token and is_admin(request.user) and token_valid(token, request.user)):
+            return self.get_response(request)
+        response, capture_id = run_profiled(request, self.get_response)
+        response['X-Profile-Id'] = capture_id
+        return response
@@ -0,0 +1,168 @@
+"""Bảng tổng hợp doanh số theo ngày (``SalesRollup``).
+
+Mỗi dòng là (ngày, sản phẩm) với số máy, doanh thu và số đơn; thương hiệu
+được JOIN qua sản phẩm khi đọc nên đổi thương hiệu của sản phẩm không làm
+lệch số liệu. ``place_order`` cộng vào khi đặt hàng, ``bulk_transition`` trừ
+ra khi đơn bị huỷ, đều trong transaction của thay đổi đó và với số truy vấn
+cố định. Báo cáo chỉ đọc bảng này nên chi phí theo số ngày chứ không theo số
+đơn hàng. ``rebuild`` tính lại từ OrderItem (lệnh
+``manage.py rebuild_sales_rollups``).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderItem, SalesRollup
+
+
+def _day(created_at):
+    return timezone.localdate(created_at)
+
+
+def day_start(day):
+    """0h ngày ``day`` theo giờ địa phương (aware).
+
+    Lọc ``created_at`` theo khoảng [day_start(a), day_start(b + 1 ngày)) thay
+    cho ``created_at__date`` để SQLite dùng được chỉ mục trên created_at.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _apply(deltas):
+    """Cộng ``{(day, phone_id): [units, revenue, orders]}`` vào bảng tổng hợp.
+
+    Một SELECT các dòng đã có, một UPDATE cộng dồn cho chúng và một
+    ``bulk_create`` cho các dòng mới, bất kể số sản phẩm.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    condition = reduce(or_, (Q(day=day, phone_id=phone_id) for day, phone_id in deltas))
+    existing = {
+        (day, phone_id): pk
+        for pk, day, phone_id in SalesRollup.objects.filter(condition).values_list('pk', 'day', 'phone_id')
+    }
+    if existing:
+        def change(index, output_field):
+            return Case(
+                *[When(pk=pk, then=deltas[key][index]) for key, pk in existing.items()],
+                output_field=output_field,
+            )
+        SalesRollup.objects.filter(pk__in=existing.values()).update(
+            units=F('units') + change(0, IntegerField()),
+            revenue=F('revenue') + change(1, DecimalField(max_digits=14, decimal_places=2)),
+            order_count=F('order_count') + change(2, IntegerField()),
+        )
+    missing = {key: delta for key, delta in deltas.items() if key not in existing}
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            SalesRollup.objects.bulk_create([
+                SalesRollup(day=day, phone_id=phone_id, units=units, revenue=revenue, order_count=orders)
+                for (day, phone_id), (units, revenue, orders) in missing.items()
+            ])
+    except IntegrityError:
+        # Đơn song song vừa tạo một trong các dòng này; lần này chúng đã có
+        _apply(missing)
+
+
+def _deltas(items, sign):
+    """``items``: các bộ (order_id, created_at, phone_id, quantity, price)."""
+    deltas = defaultdict(lambda: [0, Decimal('0'), 0])
+    seen = set()
+    for order_id, created_at, phone_id, quantity, price in items:
+        key = (_day(created_at), phone_id)
+        delta = deltas[key]
+        delta[0] += sign * quantity
+        delta[1] += sign * quantity * price
+        # Một đơn có nhiều dòng cùng sản phẩm vẫn chỉ tính một đơn
+        if (order_id, phone_id) not in seen:
+            seen.add((order_id, phone_id))
+            delta[2] += sign
+    return deltas
+
+
+def record_order(order, items):
+    """Cộng đơn vừa đặt từ các OrderItem vừa tạo."""
+    _apply(_deltas([
+        (order.pk, order.created_at, item.product_id, item.quantity, item.price)
+        for item in items
+    ], 1))
+
+
+def _order_items(order_ids):
+    return OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'order__created_at', 'product_id', 'quantity', 'price',
+    )
+
+
+def record_cancellations(order_ids):
+    """Trừ các đơn vừa bị huỷ (một truy vấn đọc OrderItem cho cả lô)."""
+    if order_ids:
+        _apply(_deltas(_order_items(order_ids), -1))
+
+
+def rebuild(since=None, until=None):
+    """Tính lại bảng tổng hợp (trong khoảng ngày nếu có) từ các đơn không bị huỷ."""
+    items = OrderItem.objects.exclude(order__status='cancelled')
+    rollups = SalesRollup.objects.all()
+    if since:
+        items = items.filter(order__created_at__gte=day_start(since))
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        items = items.filter(order__created_at__lt=day_start(until + timedelta(days=1)))
+        rollups = rollups.filter(day__lte=until)
+    rows = (
+        items.annotate(day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'product_id')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('price')),
+            order_count=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = SalesRollup.objects.bulk_create([
+            SalesRollup(
+                day=row['day'], phone_id=row['product_id'],
+                units=row['units'], revenue=row['revenue'], order_count=row['order_count'],
+            )
+            for row in rows
+        ], batch_size=500)
+    return len(created)
+
+
+def sales_summary(since, until, top=10):
+    """Số liệu cho trang báo cáo, chỉ đọc SalesRollup trong khoảng ngày."""
+    rollups = SalesRollup.objects.filter(day__gte=since, day__lte=until)
+    totals = {'units': Sum('units'), 'revenue': Sum('revenue')}
+    daily = {row['day']: row for row in rollups.values('day').annotate(**totals).order_by()}
+    days = []
+    day = since
+    while day <= until:
+        row = daily.get(day, {})
+        days.append({'day': day, 'units': row.get('units') or 0, 'revenue': row.get('revenue') or Decimal('0')})
+        day += timedelta(days=1)
+    return {
+        'totals': rollups.aggregate(**totals),
+        'days': days,
+        'brands': list(
+            rollups.values(brand_id=F('phone__brand_id'), brand_name=F('phone__brand__name'))
+            .annotate(**totals).order_by('-revenue')
+        ),
+        'phones': list(
+            rollups.values('phone_id', 'phone__name', brand_name=F('phone__brand__name'))
+            .annotate(order_count=Sum('order_count'), **totals)
+            .order_by('-revenue')[:top]
+        ),
+    }
@@ -0,0 +1,127 @@
+"""Chuyển truy vấn đọc danh mục sang read replica.
+
+Chỉ các model danh mục (Phone, Brand, ...) được đọc từ alias ``replica``;
+mọi thao tác ghi và các model giỏ hàng/đơn hàng/hồ sơ luôn ở ``default``.
+``PrimaryPinningMiddleware`` ghim cả request vào primary khi request có ghi,
+khi view thuộc nhóm cần đọc dữ liệu vừa ghi, hoặc trong vài giây sau lần
+ghi gần nhất của trình duyệt đó (cookie), để người dùng luôn thấy thay đổi
+của chính mình dù replica còn trễ. Khi file replica chưa có (trước lần
+``sync_replica`` đầu tiên) mọi truy vấn đọc vẫn ở primary.
+"""
+import os
+import sqlite3
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+REPLICA = 'replica'
+CATALOG_MODELS = {'phone', 'brand', 'brandsummary', 'catalogversion'}
+PIN_COOKIE = 'pin_primary'
+
+# Ngoài request (lệnh quản trị, shell, signal) luôn đọc từ primary
+_pinned = ContextVar('store_primary_pinned', default=True)
+_wrote = ContextVar('store_primary_wrote', default=False)
+
+
+def pin_primary():
+    _pinned.set(True)
+
+
+def primary_pinned():
+    return _pinned.get()
+
+
+_replica_ready = False
+
+
+def replica_ready():
+    """Replica chỉ dùng được khi file đã tồn tại và có bảng danh mục.
+
+    Kết quả True được nhớ trong tiến trình: replica chỉ được thay bằng bản
+    chép đầy đủ nên không quay lại trạng thái trống.
+    """
+    global _replica_ready
+    if _replica_ready:
+        return True
+    path = settings.DATABASES.get(REPLICA, {}).get('NAME')
+    if not path or not os.path.exists(path) or not os.path.getsize(path):
+        return False
+    try:
+        conn = sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+        try:
+            row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'store_phone'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    _replica_ready = row is not None
+    return _replica_ready
+
+
+class CatalogReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (model._meta.app_label == 'store'
+                and model._meta.model_name in CATALOG_MODELS
+                and not primary_pinned()
+                and replica_ready()):
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        pin_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replica là bản sao file của primary (manage.py sync_replica)
+        return db != REPLICA
+
+
+class PrimaryPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        try:
+            pinned = pinned or float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pass
+        pinned_token = _pinned.set(pinned)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                until = time.time() + settings.REPLICA_STICKY_SECONDS
+                response.set_cookie(
+                    PIN_COOKIE, '%d' % until, max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+                )
+            if response.streaming:
+                response.streaming_content = self._stream(response.streaming_content, _pinned.get())
+            return response
+        finally:
+            _pinned.reset(pinned_token)
+            _wrote.reset(wrote_token)
+
+    def _stream(self, content, pinned):
+        # Nội dung stream được đọc sau khi middleware đã trả về: khôi phục trạng thái ghim cho từng khối
+        iterator = iter(content)
+        while True:
+            token = _pinned.set(pinned)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _pinned.reset(token)
+            yield chunk
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match and request.resolver_match.url_name in settings.REPLICA_PINNED_VIEWS:
+            pin_primary()
@@ -0,0 +1,135 @@
+"""Tìm kiếm toàn văn bằng bảng ảo SQLite FTS5.
+
+Bảng ``store_phone_fts`` là chỉ mục phụ (shadow index) của Phone với
+``rowid = phone.id``, gồm tên, mô tả và tên thương hiệu đã được bỏ dấu.
+Chỉ mục được đồng bộ bởi signal trong ``store.signals`` và có thể dựng lại
+bằng ``manage.py rebuild_search_index``.
+"""
+import re
+import unicodedata
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Phone
+
+FTS_TABLE = 'store_phone_fts'
+# Trọng số bm25 theo thứ tự cột: name, description, brand
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+def fold(text):
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường: "Điện Thoại" -> "dien thoai"."""
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def build_match(query):
+    """Chuyển câu tìm kiếm thành biểu thức MATCH an toàn, so khớp tiền tố từng từ."""
+    words = re.findall(r'\w+', fold(query))
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def _connection(write=False):
+    alias = router.db_for_write(Phone) if write else router.db_for_read(Phone)
+    return connections[alias]
+
+
+def fts_available():
+    return _connection().vendor == 'sqlite'
+
+
+def _row(phone):
+    return (phone.pk, fold(phone.name), fold(phone.description), fold(phone.brand.name))
+
+
+def index_phones(phones):
+    rows = [_row(phone) for phone in phones]
+    if not rows or not fts_available():
+        return
+    with _connection(write=True).cursor() as cursor:
+        cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [(row[0],) for row in rows])
+        cursor.executemany(
+            'INSERT INTO %s (rowid, name, description, brand) VALUES (%%s, %%s, %%s, %%s)' % FTS_TABLE,
+            rows,
+        )
+
+
+def remove_phone(phone_id):
+    if not fts_available():
+        return
+    with _connection(write=True).cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [phone_id])
+
+
+def rebuild_index(batch_size=500):
+    """Xoá và dựng lại toàn bộ chỉ mục, trả về số sản phẩm đã index."""
+    if not fts_available():
+        return 0
+    with _connection(write=True).cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % FTS_TABLE)
+    total = 0
+    batch = []
+    for phone in Phone.objects.select_related('brand').iterator(chunk_size=batch_size):
+        batch.append(phone)
+        if len(batch) >= batch_size:
+            index_phones(batch)
+            total += len(batch)
+            batch = []
+    index_phones(batch)
+    total += len(batch)
+    with _connection(write=True).cursor() as cursor:
+        cursor.execute("INSERT INTO %s (%s) VALUES ('optimize')" % (FTS_TABLE, FTS_TABLE))
+    return total
+
+
+class PhoneSearch:
+    """Kết quả tìm kiếm xếp hạng theo bm25, dùng được trực tiếp với ``Paginator``."""
+
+    def __init__(self, query):
+        self.query = query
+        self.match = build_match(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        if not fts_available():
+            return self._fallback().count()
+        with _connection().cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM %s WHERE %s MATCH %%s' % (FTS_TABLE, FTS_TABLE),
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.match:
+            return []
+        if not fts_available():
+            return list(self._fallback()[key])
+        start = key.start or 0
+        limit = -1 if key.stop is None else key.stop - start
+        with _connection().cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM %s WHERE %s MATCH %%s ORDER BY bm25(%s, %s) LIMIT %%s OFFSET %%s' % (
+                    FTS_TABLE, FTS_TABLE, FTS_TABLE, ', '.join(str(w) for w in BM25_WEIGHTS),
+                ),
+                [self.match, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        phones = Phone.objects.select_related('brand').in_bulk(ids)
+        return [phones[pk] for pk in ids if pk in phones]
+
+    def _fallback(self):
+        # CSDL không phải SQLite: quay về LIKE trên các cột gốc
+        return Phone.objects.select_related('brand').filter(
+            Q(name__icontains=self.query)
+            | Q(description__icontains=self.query)
+            | Q(brand__name__icontains=self.query)
+        ).order_by('-id')
@@ -0,0 +1,26 @@
+"""Session engine chỉ ghi khi dữ liệu session thực sự thay đổi.
+
+Bọc quanh engine chọn bởi ``SESSION_BASE_ENGINE`` (signed_cookies, cached_db
+hoặc db). Django đánh dấu session là ``modified`` mỗi lần gán giá trị, kể cả
+khi giá trị không đổi; lớp này bỏ qua các lần gán như vậy nên
+SessionMiddleware không lưu lại session (và không ghi ``django_session``).
+"""
+from importlib import import_module
+
+from django.conf import settings
+
+_base = import_module(settings.SESSION_BASE_ENGINE)
+
+_missing = object()
+
+
+class SessionStore(_base.SessionStore):
+    def __setitem__(self, key, value):
+        if self._session.get(key, _missing) == value:
+            return
+        super().__setitem__(key, value)
+
+    def update(self, dict_):
+        changed = {key: value for key, value in dict_.items() if self._session.get(key, _missing) != value}
+        if changed:
+            super().update(changed)
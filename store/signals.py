@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import directory, images, search, suggest
+from .cache import bump_generation
+from .models import Brand, CatalogVersion, Phone, Profile
+
+
+@receiver(post_save, sender=Phone)
+def index_phone(sender, instance, **kwargs):
+    search.index_phones([instance])
+
+
+@receiver(post_delete, sender=Phone)
+def unindex_phone(sender, instance, **kwargs):
+    search.remove_phone(instance.pk)
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_phones(sender, instance, created, **kwargs):
+    if not created:
+        search.index_phones(instance.phone_set.select_related('brand'))
+
+
+# Chỉ mục gợi ý nằm trong bộ nhớ, không rollback được: chỉ cập nhật sau khi commit
+@receiver(post_save, sender=Phone)
+def update_phone_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest.index.update_phone(instance))
+
+
+@receiver(post_delete, sender=Phone)
+def remove_phone_suggestions(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest.index.remove_phone(pk))
+
+
+@receiver(post_save, sender=Brand)
+def update_brand_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest.index.update_brand(instance))
+
+
+@receiver(post_delete, sender=Brand)
+def remove_brand_suggestions(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest.index.remove_brand(pk))
+
+
+IMAGE_FIELDS = {Phone: 'image', Brand: 'logo', Profile: 'avatar'}
+
+
+@receiver(post_save, sender=Phone)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Profile)
+def build_image_derivatives(sender, instance, **kwargs):
+    field_file = getattr(instance, IMAGE_FIELDS[sender])
+    if images.needs_derivatives(field_file):
+        transaction.on_commit(lambda: images.schedule_derivatives(field_file))
+
+
+@receiver(pre_save, sender=Phone)
+def remember_phone_brand(sender, instance, **kwargs):
+    instance._previous_brand_id = None
+    if instance.pk:
+        instance._previous_brand_id = (
+            Phone.objects.filter(pk=instance.pk).values_list('brand_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Phone)
+def update_brand_summary(sender, instance, **kwargs):
+    directory.refresh_brand_summary(instance.brand_id)
+    previous = getattr(instance, '_previous_brand_id', None)
+    if previous and previous != instance.brand_id:
+        directory.refresh_brand_summary(previous)
+
+
+@receiver(post_delete, sender=Phone)
+def update_brand_summary_on_delete(sender, instance, origin=None, **kwargs):
+    # Xoá thương hiệu kéo theo xoá Phone: bản tóm tắt cũng bị xoá cùng
+    if isinstance(origin, Brand) or getattr(origin, 'model', None) is Brand:
+        return
+    directory.refresh_brand_summary(instance.brand_id)
+
+
+@receiver(post_save, sender=Brand)
+def create_brand_summary(sender, instance, created, **kwargs):
+    if created:
+        directory.refresh_brand_summary(instance.pk)
+
+
+def _bump_catalog():
+    CatalogVersion.bump()
+    bump_generation()
+
+
+# Nối sau các receiver cập nhật BrandSummary/FTS ở trên. Version (ETag/
+# Last-Modified) và generation chỉ tăng sau khi commit, để request song song
+# không render dữ liệu cũ rồi cache/trả nó như bản mới.
+@receiver(post_save, sender=Phone)
+@receiver(post_delete, sender=Phone)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(_bump_catalog)
@@ -0,0 +1,134 @@
+"""Gợi ý tìm kiếm khi gõ phím, phục vụ hoàn toàn từ bộ nhớ của tiến trình.
+
+Chỉ mục là một danh sách khoá đã sắp xếp (tìm tiền tố bằng ``bisect``),
+được nạp lười ở lần dùng đầu tiên và cập nhật từng phần qua signal của
+Phone/Brand. Các worker khác nhận biết thay đổi qua generation của danh mục
+(``store.cache``) và chỉ khi đó mới nạp lại từ CSDL.
+"""
+import bisect
+import threading
+
+from django.urls import reverse
+
+from .cache import get_generation
+from .models import Brand, Phone
+from .search import fold
+
+MAX_SUGGESTIONS = 8
+
+
+def _keys(label):
+    """Mỗi từ trong tên đều là điểm bắt đầu của một khoá: "note 12" khớp "Redmi Note 12"."""
+    words = fold(label).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+class SuggestionIndex:
+    """Chỉ mục copy-on-write: cập nhật dựng bản mới rồi thay tham chiếu.
+
+    ``suggest`` đọc ``self._state`` một lần và không cần khoá, nên luồng đọc
+    (gunicorn gthread) không bao giờ thấy danh sách đang bị sửa dở.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._generation = None
+        # (danh sách khoá đã sắp xếp, {(kind, pk): (label, url, keys)})
+        self._state = ([], {})
+
+    @staticmethod
+    def _add(keys, items, kind, pk, label, url):
+        item = (kind, pk)
+        SuggestionIndex._remove(keys, items, item)
+        labels = _keys(label)
+        items[item] = (label, url, labels)
+        for key in labels:
+            bisect.insort(keys, (key, kind, pk))
+
+    @staticmethod
+    def _remove(keys, items, item):
+        entry = items.pop(item, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            position = bisect.bisect_left(keys, (key,) + item)
+            if position < len(keys) and keys[position] == (key,) + item:
+                del keys[position]
+
+    def load(self):
+        # Đọc generation trước khi truy vấn: nếu có thay đổi trong lúc nạp thì
+        # lần gọi sau thấy generation mới và nạp lại
+        generation = get_generation()
+        keys = []
+        items = {}
+        for pk, name in Brand.objects.values_list('pk', 'name'):
+            url = reverse('brand_detail', args=[pk])
+            items[('brand', pk)] = (name, url, _keys(name))
+        for pk, name in Phone.objects.filter(available=True).values_list('pk', 'name'):
+            url = reverse('phone_detail', args=[pk])
+            items[('phone', pk)] = (name, url, _keys(name))
+        for (kind, pk), entry in items.items():
+            keys.extend((key, kind, pk) for key in entry[2])
+        keys.sort()
+        self._state = (keys, items)
+        self._generation = generation
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        generation = get_generation()
+        if self._loaded and self._generation == generation:
+            return
+        with self._lock:
+            if not self._loaded or self._generation != generation:
+                self.load()
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        prefix = ' '.join(fold(query).split())
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        keys, items = self._state
+        results = []
+        seen = set()
+        position = bisect.bisect_left(keys, (prefix,))
+        while position < len(keys) and len(results) < limit:
+            key, kind, pk = keys[position]
+            if not key.startswith(prefix):
+                break
+            position += 1
+            if (kind, pk) in seen or (kind, pk) not in items:
+                continue
+            seen.add((kind, pk))
+            label, url, _ = items[(kind, pk)]
+            results.append({'label': label, 'kind': kind, 'url': url})
+        return results
+
+    def update_phone(self, phone):
+        self._update('phone', phone.pk, phone.name if phone.available else None, 'phone_detail')
+
+    def remove_phone(self, pk):
+        self._update('phone', pk, None, None)
+
+    def update_brand(self, brand):
+        self._update('brand', brand.pk, brand.name, 'brand_detail')
+
+    def remove_brand(self, pk):
+        self._update('brand', pk, None, None)
+
+    def _update(self, kind, pk, label, url_name):
+        if not self._loaded:
+            # Chưa nạp thì lần dùng đầu tiên sẽ đọc dữ liệu mới nhất
+            return
+        with self._lock:
+            keys, items = self._state
+            keys, items = list(keys), dict(items)
+            if label is None:
+                self._remove(keys, items, (kind, pk))
+            else:
+                self._add(keys, items, kind, pk, label, reverse(url_name, args=[pk]))
+            # Giữ generation của bản đã nạp: thay đổi ở process khác chỉ đến qua load()
+            self._state = (keys, items)
+
+
+index = SuggestionIndex()
@@ -0,0 +1,34 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from store.images import FORMATS, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(field_file, alt='', sizes='100vw', **attrs):
+    """``<picture>`` với srcset WebP/JPEG, quay về ảnh gốc nếu chưa có ảnh phái sinh.
+
+    Ví dụ: ``{% responsive_image phone.image alt=phone.name sizes="(min-width: 992px) 25vw, 100vw" class="card-img-top" %}``
+    """
+    if not field_file:
+        return ''
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    sources = []
+    for ext, _, mime in FORMATS:
+        candidates = srcset(field_file, ext)
+        if candidates:
+            sources.append(format_html(
+                '<source type="{}" srcset="{}" sizes="{}">',
+                mime,
+                ', '.join('%s %dw' % candidate for candidate in candidates),
+                sizes,
+            ))
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" loading="lazy" decoding="async"{}></picture>',
+        format_html_join('', '{}', ((source,) for source in sources)),
+        field_file.url,
+        alt,
+        extra,
+    )
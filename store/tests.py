@@ -1,3 +1,1680 @@
-from django.test import TestCase
+import os
+import re
+import runpy
+import shutil
+import sqlite3
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import anon_cart, context_processors, db, images, inventory, metrics, notifications, profiling, reports, routers, suggest, views
+from .cache import bump_generation, get_generation, grid_stats, reset_grid_stats
+from .cart import add_item, get_cart_count, load_cart, set_quantity
+from .directory import brand_directory, rebuild_brand_summaries
+from .models import Brand, BrandSummary, Cart, CatalogVersion, NotificationOutbox, Order, OrderItem, Phone, SalesRollup, StockReservation
+from .orders import TRANSITIONS, EmptyCart, OutOfStock, allowed_sources, bulk_transition, can_transition, place_order
+from .pagination import EstimatedCountPaginator, KeysetPaginator, decode_cursor, encode_cursor
+from .search import PhoneSearch, fold
+from .templatetags.store_images import responsive_image
+
+# Một số template trang (chi tiết, giỏ hàng, thanh toán, hồ sơ) không nằm
+# trong repo; bản tối giản dưới đây vẫn duyệt đủ dữ liệu view truyền vào.
+STUB_TEMPLATES = {
+    'store/phone_detail.html': (
+        "{% extends 'store/base.html' %}{% block content %}{{ phone.name }} ${{ phone.price }}{% endblock %}"
+    ),
+    'store/cart.html': (
+        "{% extends 'store/base.html' %}{% block content %}"
+        "{% for line in cart_items %}{{ line.phone.name }} x{{ line.quantity }};{% endfor %}"
+        "Tổng: {{ total|stringformat:'s' }}{% endblock %}"
+    ),
+    'store/checkout.html': (
+        "{% extends 'store/base.html' %}{% block content %}"
+        "{% for line in cart_items %}{{ line.phone.name }} x{{ line.quantity }};{% endfor %}"
+        "Tổng: {{ total|stringformat:'s' }}{% endblock %}"
+    ),
+    'store/cart_summary.html': (
+        "{% extends 'store/base.html' %}{% block content %}"
+        "{% for line in cart %}{{ line.phone.name }} x{{ line.quantity }};{% endfor %}"
+        "Tổng: {{ total|stringformat:'s' }}{% endblock %}"
+    ),
+    'store/profile.html': (
+        "{% extends 'store/base.html' %}{% block content %}"
+        "{% for order in orders %}#{{ order.id }} {{ order.get_status_display }};{% endfor %}{% endblock %}"
+    ),
+}
+
+with_stub_templates = override_settings(TEMPLATES=[{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.locmem.Loader', STUB_TEMPLATES),
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ],
+    },
+}])
+
+def setUpModule():
+    # Cả lượt test ghi số liệu vào một file tạm, không chạm file metrics thật
+    global _metrics_dir, _metrics_override
+    _metrics_dir = tempfile.mkdtemp()
+    _metrics_override = override_settings(METRICS_DB_PATH=os.path.join(_metrics_dir, 'metrics.sqlite3'))
+    _metrics_override.enable()
+
+
+def tearDownModule():
+    # Dồn phần còn trong buffer vào file tạm trước khi trả lại đường dẫn thật
+    metrics.buffer.flush()
+    _metrics_override.disable()
+    shutil.rmtree(_metrics_dir)
+
+
+SCAN = re.compile(r'^SCAN (\w+)(.*)$')
+LIMIT = re.compile(r'\bLIMIT \d+', re.IGNORECASE)
+
+
+def create_phone(brand, name='Máy', **fields):
+    fields.setdefault('description', 'Mô tả')
+    fields.setdefault('price', Decimal('100'))
+    fields.setdefault('stock', 5)
+    return Phone.objects.create(name=name, brand=brand, **fields)
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@with_stub_templates
+class QueryPlanTests(TestCase):
+    """Mọi truy vấn của các view nóng phải đi qua chỉ mục, không quét toàn bảng.
+
+    Truy vấn được lấy từ chính request tới view (CaptureQueriesContext).
+    Duyệt theo thứ tự rowid hoặc một chỉ mục được chấp nhận khi truy vấn có
+    LIMIT và không cần sắp xếp lại (không có "TEMP B-TREE"). Chỉ các bảng
+    nêu trong ``allowed`` mới được quét, kèm lý do.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        cls.admin = User.objects.create_superuser('quantri', password='matkhau-123')
+        cls.brands = [Brand.objects.create(name='Hãng %d' % i) for i in range(3)]
+        cls.phones = [
+            Phone.objects.create(
+                name='Điện thoại %d' % i, brand=cls.brands[i % 3], description='Mô tả',
+                price=Decimal('1000000'), stock=10, available=i % 4 != 0,
+            )
+            for i in range(30)
+        ]
+        for phone in cls.phones[:3]:
+            Cart.objects.create(user=cls.user, phone=phone, quantity=1)
+        for _ in range(3):
+            order = Order.objects.create(
+                user=cls.user, full_name='Khách', phone='0900000000', address='HN',
+                payment_method='cod', total=Decimal('1000000'),
+            )
+            OrderItem.objects.create(order=order, product=cls.phones[1], quantity=1, price=Decimal('1000000'))
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNoFullScan(self, queries, allowed=()):
+        self.assertTrue(queries)
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            plan = query_plan(sql)
+            ordered = LIMIT.search(sql) and not any('TEMP B-TREE' in detail for detail in plan)
+            for detail in plan:
+                match = SCAN.match(detail)
+                if not match or 'VIRTUAL TABLE' in detail or match.group(1) == 'CONSTANT':
+                    continue
+                if ordered:
+                    continue
+                if match.group(1) not in allowed:
+                    self.fail('Quét toàn bảng (%s) trong truy vấn:\n%s' % (detail, sql))
+
+    def capture(self, url, user=None, method='get'):
+        if user:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertIn(response.status_code, (200, 302))
+        return ctx.captured_queries
+
+    def test_home(self):
+        # Danh sách thương hiệu hiển thị toàn bộ (kèm bản tóm tắt)
+        self.assertNoFullScan(self.capture('/'), allowed={'store_brand'})
+
+    def test_home_next_page(self):
+        match = re.search(r'\?cursor=([\w=-]+)', self.client.get('/').content.decode())
+        self.assertIsNotNone(match)
+        cursor = match.group(1)
+        self.assertNoFullScan(self.capture('/?cursor=%s' % cursor), allowed={'store_brand'})
+
+    def test_brand_detail(self):
+        self.assertNoFullScan(self.capture('/brands/%d/' % self.brands[0].pk))
+
+    def test_phone_detail(self):
+        self.assertNoFullScan(self.capture('/phones/%d/' % self.phones[5].pk, self.user))
+
+    def test_phone_list(self):
+        # Trang tất cả sản phẩm cố ý đọc toàn bộ bảng (stream theo thứ tự khoá chính)
+        self.assertNoFullScan(self.capture('/phones/'), allowed={'store_phone'})
+
+    def test_search(self):
+        self.assertNoFullScan(self.capture('/search/?q=thoai'))
+
+    def test_cart(self):
+        self.assertNoFullScan(self.capture('/cart/', self.user))
+
+    def test_checkout(self):
+        self.assertNoFullScan(self.capture('/checkout/', self.user))
+
+    def test_profile(self):
+        self.assertNoFullScan(self.capture('/profile/', self.user))
+
+    def test_admin_orders(self):
+        for url in ('/admin/orders/', '/admin/orders/?status=pending',
+                    '/admin/orders/?date_from=2000-01-01&date_to=2100-01-01'):
+            queries = self.capture(url, self.admin)
+            # Số đơn theo trạng thái: đúng một GROUP BY, chỉ duyệt chỉ mục (status, id) chứ không đọc bảng
+            grouped = [query for query in queries if 'COUNT("store_order"."id") AS "n"' in query['sql']]
+            self.assertEqual(len(grouped), 1)
+            for detail in query_plan(grouped[0]['sql']):
+                if SCAN.match(detail):
+                    self.assertIn('COVERING INDEX', detail)
+            self.assertNoFullScan([query for query in queries if query not in grouped])
+
+    def test_cart_api(self):
+        self.assertNoFullScan(self.capture('/cart/api/add/%d/' % self.phones[5].pk, self.user, 'post'))
+
+    def test_available_filter(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(Phone.objects.filter(available=True).order_by('-id')[:20])
+        self.assertNoFullScan(ctx.captured_queries)
+
+
+class AdminQueryCountTests(TestCase):
+    """Số truy vấn của trang admin không được tăng theo số dòng hiển thị."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('quantri', password='matkhau-123')
+        cls.brand = Brand.objects.create(name='Hãng')
+        cls.next_id = 0
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, n):
+        for _ in range(n):
+            AdminQueryCountTests.next_id += 1
+            i = AdminQueryCountTests.next_id
+            user = User.objects.create_user('khach%d' % i)
+            phone = Phone.objects.create(
+                name='Máy %d' % i, brand=self.brand, description='Mô tả',
+                price=Decimal('100'), stock=5,
+            )
+            Cart.objects.create(user=user, phone=phone, quantity=2)
+            order = Order.objects.create(
+                user=user, full_name='Khách %d' % i, phone='0900000000', address='HN',
+                payment_method='cod', total=Decimal('200'),
+            )
+            OrderItem.objects.create(order=order, product=phone, quantity=2, price=Decimal('100'))
+
+    def count_queries(self, url):
+        # Lần gọi đầu làm ấm session và cache số dòng
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_rows(2)
+        few = self.count_queries(url)
+        self.add_rows(8)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_order_changelist(self):
+        self.assertConstantQueries('/admin/store/order/')
+
+    def test_order_changelist_filtered(self):
+        self.assertConstantQueries('/admin/store/order/?status__exact=pending&created_at__gte=2000-01-01')
+
+    def test_cart_changelist(self):
+        self.assertConstantQueries('/admin/store/cart/')
+
+    def test_phone_changelist(self):
+        self.assertConstantQueries('/admin/store/phone/')
+
+    def test_order_change_page(self):
+        self.add_rows(1)
+        order = Order.objects.get()
+        few = self.count_queries('/admin/store/order/%d/change/' % order.pk)
+        for phone in Phone.objects.all()[:1]:
+            for _ in range(5):
+                OrderItem.objects.create(order=order, product=phone, quantity=1, price=Decimal('100'))
+        self.assertEqual(self.count_queries('/admin/store/order/%d/change/' % order.pk), few)
+
+    def test_estimated_count_uses_sqlite_stat1(self):
+        self.add_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        paginator = EstimatedCountPaginator(Order.objects.all(), 100)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(paginator.count, 3)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in ctx.captured_queries))
+
+    def test_estimated_count_ignores_partial_index(self):
+        # store_phone_available_id chỉ chứa các máy đang bán
+        for i in range(6):
+            create_phone(self.brand, 'Máy %d' % i, available=i < 2)
+        db.refresh_stats()
+        paginator = EstimatedCountPaginator(Phone.objects.order_by('pk'), 100)
+        self.assertEqual(paginator.count, 6)
+
+    def test_refresh_stats_updates_estimate(self):
+        self.add_rows(2)
+        db.refresh_stats()
+        self.add_rows(3)
+        self.assertEqual(EstimatedCountPaginator(Order.objects.all(), 100).count, 2)
+        call_command('refresh_sqlite_stats', stdout=StringIO())
+        self.assertEqual(EstimatedCountPaginator(Order.objects.all(), 100).count, 5)
+
+    def test_pages_past_stale_estimate(self):
+        self.add_rows(5)
+        paginator = EstimatedCountPaginator(Order.objects.order_by('pk'), 2)
+        with mock.patch.object(EstimatedCountPaginator, '_table_estimate', return_value=2):
+            self.assertEqual(paginator.num_pages, 1)
+            self.assertEqual(len(paginator.page(2)), 2)
+            self.assertEqual(len(paginator.page(3)), 1)
+            self.assertEqual(len(paginator.page(4)), 0)
+            with self.assertRaises(EmptyPage):
+                paginator.page(0)
+
+
+class ReplicaRouterTests(TestCase):
+    """Đọc danh mục từ replica chỉ khi replica đã được đồng bộ và request không bị ghim."""
+
+    def setUp(self):
+        routers._replica_ready = False
+        self.addCleanup(setattr, routers, '_replica_ready', False)
+        self.router = routers.CatalogReplicaRouter()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'replica.sqlite3')
+        patcher = mock.patch.dict(settings.DATABASES, {'replica': {'NAME': self.path}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def unpinned(self):
+        token = routers._pinned.set(False)
+        self.addCleanup(routers._pinned.reset, token)
+
+    def sync(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE store_phone (id integer PRIMARY KEY)')
+        conn.commit()
+        conn.close()
+
+    def test_outside_request_reads_primary(self):
+        self.sync()
+        self.assertEqual(self.router.db_for_read(Phone), 'default')
+
+    def test_missing_replica_falls_back_to_primary(self):
+        self.unpinned()
+        self.assertEqual(self.router.db_for_read(Phone), 'default')
+        # File rỗng (chưa chạy sync_replica) cũng không dùng được
+        open(self.path, 'w').close()
+        self.assertEqual(self.router.db_for_read(Phone), 'default')
+
+    def test_synced_replica_serves_catalog_reads(self):
+        self.sync()
+        self.unpinned()
+        self.assertEqual(self.router.db_for_read(Phone), 'replica')
+        self.assertEqual(self.router.db_for_read(Brand), 'replica')
+        self.assertEqual(self.router.db_for_read(Cart), 'default')
+
+    def test_write_pins_request_to_primary(self):
+        self.sync()
+        self.unpinned()
+        self.assertEqual(self.router.db_for_write(Phone), 'default')
+        self.assertEqual(self.router.db_for_read(Phone), 'default')
+
+
+class PrimaryPinningTests(TestCase):
+    def test_post_sets_sticky_cookie(self):
+        user = User.objects.create_user('khach', password='matkhau-123')
+        phone = Phone.objects.create(
+            name='Máy', brand=Brand.objects.create(name='Hãng'), description='Mô tả',
+            price=Decimal('100'), stock=5,
+        )
+        self.client.force_login(user)
+        response = self.client.post('/cart/api/add/%d/' % phone.pk)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertNotIn(routers.PIN_COOKIE, self.client.get('/brands/').cookies)
+
+
+class CatalogGridCacheTests(TestCase):
+    """Lưới sản phẩm được cache theo generation và tự hết hạn khi danh mục đổi."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Hãng')
+        for i in range(3):
+            create_phone(cls.brand, 'Máy %d' % i)
+
+    def setUp(self):
+        cache.clear()
+        reset_grid_stats()
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/')
+        self.assertContains(response, 'Máy 2')
+        self.assertEqual(grid_stats()['hits'], 1)
+        self.assertFalse(any('"store_phone"' in query['sql'] for query in ctx.captured_queries))
+        # Bộ đếm nằm trong file metrics dùng chung và được xuất ra /metrics
+        self.assertIn('store_grid_cache_hits_total 1', metrics.render_prometheus())
+
+    def test_phone_change_bumps_generation(self):
+        self.client.get('/brands/%d/' % self.brand.pk)
+        generation = get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_phone(self.brand, 'Máy mới')
+            # Chưa commit thì generation chưa đổi
+            self.assertEqual(get_generation(), generation)
+        self.assertGreater(get_generation(), generation)
+        self.assertContains(self.client.get('/brands/%d/' % self.brand.pk), 'Máy mới')
+        self.assertEqual(grid_stats()['misses'], 2)
+
+    def test_brand_change_bumps_generation(self):
+        generation = get_generation()
+        self.brand.name = 'Hãng khác'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.save()
+        self.assertGreater(get_generation(), generation)
+
+    def test_rolled_back_change_keeps_generation(self):
+        generation = get_generation()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    create_phone(self.brand, 'Máy huỷ')
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_generation(), generation)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Hãng')
+        cls.phones = [create_phone(brand, 'Máy %d' % i) for i in range(7)]
+
+    def ids(self, page):
+        return [phone.pk for phone in page]
+
+    def test_pages_follow_cursors_in_both_directions(self):
+        paginator = KeysetPaginator(Phone.objects.all(), 3)
+        expected = [phone.pk for phone in reversed(self.phones)]
+        first = paginator.get_page()
+        self.assertEqual(self.ids(first), expected[:3])
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(self.ids(second), expected[3:6])
+        last = paginator.get_page(second.next_cursor)
+        self.assertEqual(self.ids(last), expected[6:])
+        self.assertFalse(last.has_next())
+        self.assertEqual(self.ids(paginator.get_page(last.previous_cursor)), expected[3:6])
+        self.assertEqual(self.ids(paginator.get_page(second.previous_cursor)), expected[:3])
+
+    def test_no_count_or_offset(self):
+        paginator = KeysetPaginator(Phone.objects.all(), 3)
+        cursor = encode_cursor('n', self.phones[4].pk)
+        with CaptureQueriesContext(connection) as ctx:
+            list(paginator.get_page(cursor))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        for cursor in ('', 'khong-hop-le', encode_cursor('x', 5), encode_cursor('n', 0)):
+            self.assertIsNone(decode_cursor(cursor))
+        page = KeysetPaginator(Phone.objects.all(), 3).get_page('khong-hop-le')
+        self.assertEqual(self.ids(page), [phone.pk for phone in reversed(self.phones)][:3])
+
+    def test_count_is_lazy(self):
+        calls = []
+        paginator = KeysetPaginator(Phone.objects.all(), 3, count=lambda: calls.append(1) or 7)
+        paginator.get_page()
+        self.assertEqual(calls, [])
+        self.assertEqual(paginator.count, 7)
+        self.assertEqual(paginator.count, 7)
+        self.assertEqual(calls, [1])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Xiaomi')
+        cls.named = create_phone(cls.brand, 'Điện thoại Gấu', description='Máy nhỏ gọn')
+        cls.described = create_phone(cls.brand, 'Redmi', description='Kèm ốp hình gấu')
+        create_phone(Brand.objects.create(name='Nokia'), 'Nokia 3310')
+
+    def names(self, query):
+        return [phone.name for phone in PhoneSearch(query)[:10]]
+
+    def test_fold(self):
+        self.assertEqual(fold('Điện Thoại'), 'dien thoai')
+
+    def test_matches_without_diacritics_and_ranks_name_first(self):
+        self.assertEqual(self.names('gau'), ['Điện thoại Gấu', 'Redmi'])
+        self.assertEqual(self.names('GẤU'), ['Điện thoại Gấu', 'Redmi'])
+        self.assertEqual(PhoneSearch('gau').count(), 2)
+
+    def test_prefix_and_brand_match(self):
+        self.assertEqual(self.names('noki'), ['Nokia 3310'])
+        self.assertEqual(sorted(self.names('xiaomi')), ['Redmi', 'Điện thoại Gấu'])
+
+    def test_punctuation_is_not_fts_syntax(self):
+        self.assertEqual(self.names('"gau" (* -'), ['Điện thoại Gấu', 'Redmi'])
+        self.assertEqual(self.names('!!!'), [])
+
+    def test_index_follows_changes(self):
+        self.brand.name = 'Hãng Mới'
+        self.brand.save()
+        self.assertEqual(self.names('xiaomi'), [])
+        self.assertEqual(len(self.names('hang moi')), 2)
+        self.described.delete()
+        self.assertEqual(self.names('gau'), ['Điện thoại Gấu'])
+
+    def test_search_view(self):
+        response = self.client.get('/search/', {'q': 'dien thoai'})
+        self.assertContains(response, 'Điện thoại Gấu')
+        self.assertNotContains(response, 'Nokia 3310')
+
+
+class SuggestionIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Xiaomi')
+        cls.phone = create_phone(cls.brand, 'Redmi Note 12')
+        create_phone(cls.brand, 'Redmi Cũ', available=False)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(suggest, 'index', suggest.SuggestionIndex())
+        self.index = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def labels(self, query):
+        return [item['label'] for item in self.index.suggest(query)]
+
+    def test_prefix_of_any_word(self):
+        self.assertEqual(self.labels('note 1'), ['Redmi Note 12'])
+        self.assertEqual(self.labels('REDMI'), ['Redmi Note 12'])
+        self.assertEqual(self.labels('xiao'), ['Xiaomi'])
+        self.assertEqual(self.labels('   '), [])
+
+    def test_follows_catalog_changes(self):
+        self.labels('redmi')
+        self.phone.name = 'Poco F5'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.save()
+        self.assertEqual(self.labels('redmi'), [])
+        self.assertEqual(self.labels('poco'), ['Poco F5'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.delete()
+        self.assertEqual(self.labels('poco'), [])
+
+    def test_rolled_back_change_not_indexed(self):
+        self.labels('redmi')
+        try:
+            with transaction.atomic():
+                create_phone(self.brand, 'Poco X6')
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertEqual(self.labels('poco'), [])
+
+    def test_generation_read_before_loading(self):
+        generation = get_generation()
+        real_values_list = Brand.objects.values_list
+
+        def bump_during_load(*args, **kwargs):
+            # Một thay đổi được commit khi index đang đọc bảng
+            bump_generation()
+            return real_values_list(*args, **kwargs)
+
+        with mock.patch.object(Brand.objects, 'values_list', side_effect=bump_during_load):
+            self.index.load()
+        self.assertEqual(self.index._generation, generation)
+        with mock.patch.object(self.index, 'load', wraps=self.index.load) as load:
+            self.labels('redmi')
+        load.assert_called_once()
+
+    def test_updates_do_not_mutate_published_state(self):
+        self.labels('redmi')
+        keys, items = self.index._state
+        before = list(keys)
+        self.index.update_brand(Brand(pk=999, name='Apple'))
+        self.assertEqual(keys, before)
+        self.assertNotIn(('brand', 999), items)
+        self.assertIn(('brand', 999), self.index._state[1])
+
+    def test_suggest_endpoint(self):
+        response = self.client.get('/search/suggest/', {'q': 'red'})
+        self.assertEqual(response.json()['suggestions'], [
+            {'label': 'Redmi Note 12', 'kind': 'phone', 'url': '/phones/%d/' % self.phone.pk},
+        ])
+
+
+class PhoneListStreamingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Hãng')
+        cls.phones = [create_phone(brand, 'Máy %d' % i) for i in range(5)]
+
+    def test_streams_head_rows_in_chunks_and_tail(self):
+        with mock.patch.object(views, 'PHONE_LIST_CHUNK_SIZE', 2):
+            response = self.client.get('/phones/')
+            self.assertTrue(response.streaming)
+            chunks = [chunk.decode() for chunk in response.streaming_content]
+        # Đầu trang, 3 khối sản phẩm (2 + 2 + 1), cuối trang
+        self.assertEqual(len(chunks), 5)
+        self.assertIn('Tất cả sản phẩm', chunks[0])
+        self.assertNotIn('Máy', chunks[0])
+        self.assertIn('</html>', chunks[-1])
+        body = ''.join(chunks)
+        positions = [body.index('Máy %d<' % i) for i in reversed(range(5))]
+        self.assertEqual(positions, sorted(positions))
+
+    @override_settings(PHONE_LIST_STREAMING=False)
+    def test_buffered_mode(self):
+        response = self.client.get('/phones/')
+        self.assertFalse(response.streaming)
+        for phone in self.phones:
+            self.assertContains(response, phone.name)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'PNG')
+        self.phone = create_phone(Brand.objects.create(name='Hãng'))
+        self.phone.image.save('may.png', ContentFile(buffer.getvalue()))
+
+    def test_generates_widths_smaller_than_original(self):
+        self.assertEqual(images.generate_derivatives(self.phone.image), 4)
+        self.assertEqual(images.available_widths(self.phone.image), {'webp': [64, 320], 'jpg': [64, 320]})
+        self.assertTrue(images.has_derivatives(self.phone.image))
+        # Chạy lại không ghi đè ảnh đã có
+        self.assertEqual(images.generate_derivatives(self.phone.image), 0)
+
+    def test_render_does_not_touch_storage_once_cached(self):
+        images.generate_derivatives(self.phone.image)
+        html = responsive_image(self.phone.image, alt='Máy')
+        self.assertIn('may.320w.webp 320w', html)
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            self.assertEqual(responsive_image(self.phone.image, alt='Máy'), html)
+        exists.assert_not_called()
+
+    def test_small_image_is_not_scheduled_again(self):
+        buffer = BytesIO()
+        Image.new('RGB', (48, 48), 'blue').save(buffer, 'PNG')
+        brand = Brand.objects.create(name='Hãng nhỏ')
+        brand.logo.save('logo.png', ContentFile(buffer.getvalue()), save=False)
+        self.assertTrue(images.needs_derivatives(brand.logo))
+        self.assertEqual(images.generate_derivatives(brand.logo), 0)
+        self.assertFalse(images.needs_derivatives(brand.logo))
+        self.assertEqual(images.srcset(brand.logo, 'webp'), [])
+        with mock.patch.object(images, 'schedule_derivatives') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                brand.save()
+        schedule.assert_not_called()
+
+    def test_brand_directory_uses_logo_derivatives(self):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'green').save(buffer, 'PNG')
+        brand = Brand.objects.create(name='Hãng có logo')
+        brand.logo.save('logo.png', ContentFile(buffer.getvalue()))
+        images.generate_derivatives(brand.logo)
+        response = self.client.get('/brands/')
+        self.assertContains(response, 'logo.320w.webp 320w')
+        self.assertContains(response, '<source type="image/webp"')
+
+    def test_missing_derivatives_fall_back_to_original(self):
+        html = responsive_image(self.phone.image, alt='Máy')
+        self.assertNotIn('<source', html)
+        self.assertIn(self.phone.image.url, html)
+        # Sinh xong thì lần render sau có srcset dù kết quả "chưa có" đã được cache
+        images.generate_derivatives(self.phone.image)
+        self.assertIn('<source type="image/webp"', responsive_image(self.phone.image))
+
+
+class BrandSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.apple = Brand.objects.create(name='Apple')
+        cls.nokia = Brand.objects.create(name='Nokia')
+        cls.phone = create_phone(cls.apple, 'iPhone', price=Decimal('900'))
+        create_phone(cls.apple, 'iPhone cũ', price=Decimal('300'), available=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def summary(self, brand):
+        summary = BrandSummary.objects.get(brand=brand)
+        return summary.phone_count, summary.available_count, summary.min_price, summary.max_price
+
+    def test_kept_in_sync_with_phones(self):
+        self.assertEqual(self.summary(self.apple), (2, 1, Decimal('300'), Decimal('900')))
+        self.assertEqual(self.summary(self.nokia), (0, 0, None, None))
+        self.phone.brand = self.nokia
+        self.phone.save()
+        self.assertEqual(self.summary(self.apple), (1, 0, Decimal('300'), Decimal('300')))
+        self.assertEqual(self.summary(self.nokia), (1, 1, Decimal('900'), Decimal('900')))
+        self.phone.delete()
+        self.assertEqual(self.summary(self.nokia), (0, 0, None, None))
+
+    def test_rebuild_repairs_drift(self):
+        BrandSummary.objects.update(phone_count=42)
+        BrandSummary.objects.filter(brand=self.nokia).delete()
+        self.assertEqual(rebuild_brand_summaries(), 2)
+        self.assertEqual(self.summary(self.apple), (2, 1, Decimal('300'), Decimal('900')))
+        self.assertEqual(self.summary(self.nokia), (0, 0, None, None))
+
+    def test_brand_directory_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            entries = brand_directory()
+        self.assertEqual([(e.name, e.phone_count, e.available_count) for e in entries],
+                         [('Apple', 2, 1), ('Nokia', 0, 0)])
+        with self.assertNumQueries(0):
+            brand_directory()
+        response = self.client.get('/brands/')
+        self.assertContains(response, '2 sản phẩm, 1 còn bán')
+
+
+@with_stub_templates
+@override_settings(STOCK_RESERVATION=True)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        cls.brand = Brand.objects.create(name='Hãng')
+        cls.phone = create_phone(cls.brand, 'Máy', stock=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_pages_answer_304(self):
+        for url in ('/', '/brands/%d/' % self.brand.pk, '/phones/%d/' % self.phone.pk):
+            etag = self.etag(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_catalog_change_invalidates(self):
+        url = '/phones/%d/' % self.phone.pk
+        etag = self.etag(url)
+        self.phone.price = Decimal('90')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.etag('/')
+        version_before = CatalogVersion.current().version
+        with self.captureOnCommitCallbacks(execute=True):
+            create_phone(self.brand, 'Máy mới')
+            # Trước commit version chưa đổi: không có bản "mới" nào dựng từ dữ liệu chưa commit
+            self.assertEqual(CatalogVersion.current().version, version_before)
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertGreater(CatalogVersion.current().version, version_before)
+
+    def test_viewer_is_part_of_etag(self):
+        anonymous = self.etag('/')
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.etag('/'), anonymous)
+
+    def test_pending_message_is_shown_instead_of_304(self):
+        url = '/phones/%d/' % self.phone.pk
+        self.client.force_login(self.user)
+        etag = self.etag(url)
+        response = self.client.post('/add-to-cart/%d/' % self.phone.pk)
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'đã hết hàng')
+        # Thông báo đã được tiêu thụ nên lần sau lại trả 304
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@with_stub_templates
+class CartServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        brand = Brand.objects.create(name='Hãng')
+        cls.phones = [create_phone(brand, 'Máy %d' % i, price=Decimal('10.5') * (i + 1)) for i in range(4)]
+        for i, phone in enumerate(cls.phones):
+            Cart.objects.create(user=cls.user, phone=phone, quantity=i + 1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_load_cart_is_one_query(self):
+        with self.assertNumQueries(1):
+            snapshot = load_cart(self.user)
+            names = [line.phone.brand.name for line in snapshot]
+        self.assertEqual(names, ['Hãng'] * 4)
+        self.assertEqual([line.total_price for line in snapshot],
+                         [Decimal('10.50'), Decimal('42.00'), Decimal('94.50'), Decimal('168.00')])
+        self.assertEqual(snapshot.total, Decimal('315.00'))
+        self.assertEqual(snapshot.count, 10)
+
+    def test_empty_cart(self):
+        snapshot = load_cart(User.objects.create_user('trong'))
+        self.assertFalse(snapshot)
+        self.assertEqual(snapshot.total, Decimal('0.00'))
+
+    def test_cart_pages_do_not_grow_with_lines(self):
+        self.client.force_login(self.user)
+        counts = []
+        for url in ('/cart/', '/cart/summary/', '/checkout/'):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertContains(response, 'Tổng: 315.00')
+            counts.append(len([q for q in ctx.captured_queries if '"store_cart"' in q['sql']]))
+        self.assertEqual(counts, [1, 1, 1])
+
+
+class CartCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        cls.phone = create_phone(Brand.objects.create(name='Hãng'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def cart_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q for q in ctx.captured_queries if '"store_cart"' in q['sql']]
+
+    def test_badge_is_cached_per_user(self):
+        Cart.objects.create(user=self.user, phone=self.phone, quantity=3)
+        response, queries = self.cart_queries('/brands/')
+        self.assertContains(response, '<span class="cart-badge">3</span>', html=True)
+        self.assertEqual(len(queries), 1)
+        response, queries = self.cart_queries('/brands/')
+        self.assertContains(response, '<span class="cart-badge">3</span>', html=True)
+        self.assertEqual(queries, [])
+
+    def test_cart_changes_invalidate_the_count(self):
+        self.assertEqual(get_cart_count(self.user), 0)
+        add_item(self.user, self.phone.pk, 2)
+        self.assertEqual(get_cart_count(self.user), 2)
+
+    def test_not_evaluated_until_used(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            count = context_processors.cart_count(request)['cart_count']
+        with self.assertNumQueries(1):
+            self.assertEqual(count + 0, 0)
+
+
+CHECKOUT_FORM = {
+    'full_name': 'Khách', 'phone': '0900000000', 'address': 'HN', 'payment_method': 'cod',
+}
+
+
+class PlaceOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        cls.brand = Brand.objects.create(name='Hãng')
+
+    def setUp(self):
+        cache.clear()
+
+    def fill_cart(self, n, stock=5):
+        phones = [create_phone(self.brand, 'Máy %d' % i, price=Decimal('10'), stock=stock) for i in range(n)]
+        for phone in phones:
+            Cart.objects.create(user=self.user, phone=phone, quantity=2)
+        return phones
+
+    def test_creates_order_items_and_takes_stock(self):
+        phones = self.fill_cart(2)
+        order = place_order(self.user, **CHECKOUT_FORM)
+        self.assertEqual(order.total, Decimal('40'))
+        self.assertEqual(
+            sorted(order.orderitem_set.values_list('product_id', 'quantity', 'price')),
+            [(phones[0].pk, 2, Decimal('10')), (phones[1].pk, 2, Decimal('10'))],
+        )
+        self.assertEqual(list(Phone.objects.values_list('stock', flat=True).distinct()), [3])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_out_of_stock_rolls_back(self):
+        phones = self.fill_cart(2)
+        Phone.objects.filter(pk=phones[1].pk).update(stock=1)
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(self.user, **CHECKOUT_FORM)
+        self.assertEqual([phone.pk for phone in raised.exception.phones], [phones[1].pk])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Phone.objects.get(pk=phones[0].pk).stock, 5)
+
+    def test_empty_cart(self):
+        with self.assertRaises(EmptyCart):
+            place_order(self.user, **CHECKOUT_FORM)
+
+    def test_constant_queries(self):
+        self.fill_cart(2)
+        with CaptureQueriesContext(connection) as ctx:
+            place_order(self.user, **CHECKOUT_FORM)
+        few = len(ctx.captured_queries)
+        self.fill_cart(8)
+        with CaptureQueriesContext(connection) as ctx:
+            place_order(self.user, **CHECKOUT_FORM)
+        self.assertEqual(len(ctx.captured_queries), few)
+
+    def test_checkout_view(self):
+        self.fill_cart(1)
+        self.client.force_login(self.user)
+        response = self.client.post('/checkout/', CHECKOUT_FORM)
+        order = Order.objects.get()
+        self.assertRedirects(response, '/order-complete/%d/' % order.pk, fetch_redirect_response=False)
+        response = self.client.post('/checkout/', CHECKOUT_FORM)
+        self.assertRedirects(response, '/cart/', fetch_redirect_response=False)
+
+
+@override_settings(STOCK_RESERVATION=True)
+class ReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        cls.phone = create_phone(Brand.objects.create(name='Hãng'), stock=5)
+
+    def setUp(self):
+        cache.clear()
+        inventory.reset_stats()
+
+    def stock(self):
+        return Phone.objects.get(pk=self.phone.pk).stock
+
+    def held(self):
+        return sum(StockReservation.objects.filter(user=self.user).values_list('quantity', flat=True))
+
+    def line(self):
+        return Cart.objects.get(user=self.user, phone=self.phone)
+
+    def test_add_reserves_stock(self):
+        self.assertTrue(add_item(self.user, self.phone.pk, 3))
+        self.assertEqual((self.stock(), self.held()), (2, 3))
+        self.assertFalse(add_item(self.user, self.phone.pk, 3))
+        self.assertEqual((self.stock(), self.held(), self.line().quantity), (2, 3, 3))
+        stats = inventory.reservation_stats()
+        self.assertEqual((stats['reserved'], stats['rejected']), (1, 1))
+
+    def test_set_quantity_moves_only_the_difference(self):
+        add_item(self.user, self.phone.pk, 2)
+        self.assertTrue(set_quantity(self.user, self.line(), 4))
+        self.assertEqual((self.stock(), self.held()), (1, 4))
+        self.assertTrue(set_quantity(self.user, self.line(), 1))
+        self.assertEqual((self.stock(), self.held()), (4, 1))
+        self.assertEqual(StockReservation.objects.filter(user=self.user).count(), 1)
+
+    def test_failed_increase_keeps_the_hold(self):
+        add_item(self.user, self.phone.pk, 2)
+        other = User.objects.create_user('khac')
+        add_item(other, self.phone.pk, 3)
+        self.assertFalse(set_quantity(self.user, self.line(), 3))
+        self.assertEqual((self.stock(), self.held(), self.line().quantity), (0, 2, 2))
+
+    def test_order_consumes_the_hold(self):
+        add_item(self.user, self.phone.pk, 2)
+        place_order(self.user, **CHECKOUT_FORM)
+        self.assertEqual((self.stock(), self.held()), (3, 0))
+
+    def test_sweep_returns_expired_holds(self):
+        add_item(self.user, self.phone.pk, 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(inventory.sweep_expired(), 1)
+        self.assertEqual((self.stock(), self.held()), (5, 0))
+        self.assertEqual(inventory.reservation_stats()['expired'], 1)
+
+
+class SharedCounterTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(METRICS_DB_PATH=os.path.join(directory, 'metrics.sqlite3'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_increments_from_several_workers_add_up(self):
+        name = 'store_reservations_reserved_total'
+        workers = [metrics.MetricsBuffer() for _ in range(3)]
+        for worker in workers:
+            worker.count(name, 2)
+        for worker in workers:
+            worker.flush()
+        self.assertEqual(metrics.read_counters([name]), {name: 6})
+        self.assertIn('store_reservations_reserved_total 6', metrics.render_prometheus())
+        metrics.reset_counters([name])
+        self.assertEqual(metrics.read_counters([name]), {name: 0})
+
+
+@with_stub_templates
+class CartUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        cls.phone = create_phone(Brand.objects.create(name='Hãng'), price=Decimal('12.5'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_add_is_an_increment_on_one_row(self):
+        add_item(self.user, self.phone.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            add_item(self.user, self.phone.pk, 2)
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 3)
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries]
+        self.assertEqual(statements.count('UPDATE'), 1)
+        self.assertNotIn('INSERT', statements)
+        self.assertNotIn('SELECT', statements)
+
+    def test_lost_insert_race_falls_back_to_update(self):
+        # Request song song tạo dòng giữa lúc UPDATE thấy 0 dòng và lúc INSERT
+        Cart.objects.create(user=self.user, phone=self.phone, quantity=1)
+        lines = Cart.objects.filter(user=self.user, phone=self.phone)
+        missed = [0]
+
+        def update(**changes):
+            return missed.pop() if missed else type(lines).update(lines, **changes)
+
+        with mock.patch.object(lines, 'update', side_effect=update), \
+                mock.patch.object(Cart.objects, 'filter', return_value=lines):
+            add_item(self.user, self.phone.pk)
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 2)
+
+    def test_json_endpoints(self):
+        response = self.client.post('/cart/api/add/%d/' % self.phone.pk)
+        data = response.json()
+        self.assertEqual((data['count'], data['total'], data['line']['quantity']), (1, '12.50', 1))
+        line_id = data['line']['id']
+        data = self.client.post('/cart/api/update/%d/' % line_id, {'quantity': 4}).json()
+        self.assertEqual((data['count'], data['total'], data['line']['total_price']), (4, '50.00', '50.00'))
+        self.assertEqual(self.client.post('/cart/api/update/%d/' % line_id, {'quantity': 'x'}).status_code, 400)
+        data = self.client.post('/cart/api/remove/%d/' % line_id).json()
+        self.assertEqual((data['count'], data['line']), (0, None))
+        self.client.logout()
+        self.assertEqual(self.client.post('/cart/api/add/%d/' % self.phone.pk).status_code, 401)
+        self.assertEqual(self.client.get('/cart/api/add/%d/' % self.phone.pk).status_code, 405)
+
+    def test_update_quantity_rejects_garbage(self):
+        line = Cart.objects.create(user=self.user, phone=self.phone, quantity=2)
+        response = self.client.post('/update-cart-quantity/%d/' % line.pk, {'quantity': 'abc'}, follow=True)
+        self.assertRedirects(response, '/cart/')
+        self.assertContains(response, 'Số lượng không hợp lệ')
+        self.assertEqual(Cart.objects.get(pk=line.pk).quantity, 2)
+        self.client.post('/update-cart-quantity/%d/' % line.pk, {'quantity': '5'})
+        self.assertEqual(Cart.objects.get(pk=line.pk).quantity, 5)
+
+
+@with_stub_templates
+class AnonymousCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+        cls.brand = Brand.objects.create(name='Hãng')
+        cls.phone = create_phone(cls.brand, 'Máy', price=Decimal('10'), stock=5)
+        cls.other = create_phone(cls.brand, 'Máy khác', price=Decimal('20'), stock=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, phone):
+        return self.client.post('/add-to-cart/%d/' % phone.pk)
+
+    def test_cart_lives_in_the_cookie(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.add(self.phone)
+        self.assertFalse(any(q['sql'].startswith(('INSERT', 'UPDATE')) for q in ctx.captured_queries))
+        self.add(self.phone)
+        self.add(self.other)
+        self.assertContains(self.client.get('/cart/'), 'Máy x2;Máy khác x1;Tổng: 40.00')
+        self.assertFalse(Cart.objects.exists())
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        self.add(self.phone)
+        value = self.client.cookies[anon_cart.COOKIE_NAME].value
+        self.client.cookies[anon_cart.COOKIE_NAME] = value.replace('-1', '-9', 1)
+        self.assertContains(self.client.get('/cart/'), 'Tổng: 0')
+
+    def test_adding_changes_the_etag(self):
+        for url in ('/', '/brands/%d/' % self.brand.pk, '/phones/%d/' % self.phone.pk):
+            etag = self.client.get(url)['ETag']
+            self.add(self.phone)
+            # Trang giỏ hàng hiển thị (và tiêu thụ) thông báo "đã thêm"
+            self.client.get('/cart/')
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+
+    def test_merge_on_login(self):
+        Cart.objects.create(user=self.user, phone=self.phone, quantity=1)
+        self.add(self.phone)
+        self.add(self.other)
+        response = self.client.post('/login/', {'username': 'khach', 'password': 'matkhau-123'})
+        self.assertEqual(response.cookies[anon_cart.COOKIE_NAME].value, '')
+        self.assertEqual(
+            sorted(Cart.objects.filter(user=self.user).values_list('phone__name', 'quantity')),
+            [('Máy', 2), ('Máy khác', 1)],
+        )
+
+    @override_settings(STOCK_RESERVATION=True)
+    def test_merge_reserves_stock(self):
+        self.add(self.phone)
+        self.add(self.other)
+        Phone.objects.filter(pk=self.other.pk).update(stock=0)
+        response = self.client.post('/login/', {'username': 'khach', 'password': 'matkhau-123'}, follow=True)
+        self.assertContains(response, 'Không đủ hàng cho: Máy khác')
+        self.assertEqual(list(Cart.objects.values_list('phone__name', 'quantity')), [('Máy', 1)])
+        self.assertEqual(Phone.objects.get(pk=self.phone.pk).stock, 4)
+        self.assertEqual(StockReservation.objects.get().quantity, 1)
+
+
+class SessionWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('khach', password='matkhau-123')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reading_pages_does_not_write_the_session(self):
+        self.client.post('/login/', {'username': 'khach', 'password': 'matkhau-123'})
+        for url in ('/', '/brands/', '/search/?q=may'):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+            self.assertEqual(writes, [], url)
+
+    def test_unchanged_assignment_does_not_mark_modified(self):
+        session = self.client.session
+        session['cart_note'] = 'a'
+        session.save()
+        session = type(session)(session.session_key)
+        session['cart_note'] = 'a'
+        session.update({'cart_note': 'a'})
+        self.assertFalse(session.modified)
+        session['cart_note'] = 'b'
+        self.assertTrue(session.modified)
+
+    def test_probe_command_leaves_no_trace(self):
+        User.objects.create_user('session-probe')
+        generation = get_generation()
+        users = User.objects.count()
+        out = StringIO()
+        call_command('measure_session_writes', requests=4, stdout=out)
+        call_command('measure_session_writes', requests=4, stdout=out)
+        self.assertEqual(out.getvalue().count('trước (db + FallbackStorage)'), 2)
+        self.assertEqual(User.objects.count(), users)
+        self.assertFalse(Phone.objects.exists())
+        self.assertEqual(get_generation(), generation)
+
+
+class ProductionProfileTests(TestCase):
+    def test_single_lock_timeout(self):
+        with mock.patch.dict(os.environ, {'DB_PROFILE': 'production', 'SQLITE_BUSY_TIMEOUT_MS': '7000'}):
+            production = runpy.run_path(os.path.join(settings.BASE_DIR, 'myproject', 'settings.py'))
+        options = production['DATABASES']['default']['OPTIONS']
+        self.assertNotIn('timeout', options)
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(production['SQLITE_PRAGMAS']['busy_timeout'], 7000)
+        self.assertEqual(production['SQLITE_PRAGMAS']['journal_mode'], 'WAL')
+
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            before = cursor.fetchone()[0]
+        self.addCleanup(connection.cursor().execute, 'PRAGMA busy_timeout = %d' % before)
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            db.apply_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+    def test_replica_skips_write_pragmas(self):
+        replica = mock.MagicMock(vendor='sqlite', alias='replica')
+        pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234}
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            db.apply_pragmas(sender=None, connection=replica)
+        executed = [c.args[0] for c in replica.cursor.return_value.__enter__.return_value.execute.call_args_list]
+        self.assertEqual(executed, ['PRAGMA busy_timeout = 1234'])
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('quantri', password='matkhau-123')
+        cls.brand = Brand.objects.create(name='Hãng')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Số liệu còn trong buffer từ các test trước được ghi ra file bỏ đi
+        with override_settings(METRICS_DB_PATH=os.path.join(directory, 'previous.sqlite3')):
+            metrics.buffer.flush()
+        settings_override = override_settings(METRICS_DB_PATH=os.path.join(directory, 'metrics.sqlite3'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_histograms_per_view(self):
+        self.client.get('/brands/%d/' % self.brand.pk)
+        self.client.get('/brands/%d/' % self.brand.pk)
+        self.client.force_login(self.admin)
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE store_db_queries histogram', body)
+        self.assertIn('store_request_duration_seconds_count{view="brand_detail"} 2', body)
+        self.assertIn('store_db_queries_bucket{view="brand_detail",le="+Inf"} 2', body)
+        queries = re.search(r'store_db_queries_sum\{view="brand_detail"\} (\d+)', body)
+        self.assertGreater(int(queries.group(1)), 0)
+        self.assertRegex(body, r'store_template_duration_seconds_sum\{view="brand_detail"\} [0-9.e-]+')
+
+    def test_metrics_requires_admin(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(METRICS_QUERY_BUDGET=1)
+    def test_query_budget_warning(self):
+        with self.assertLogs('store.metrics', 'WARNING') as logs:
+            self.client.get('/brands/%d/' % self.brand.pk)
+        self.assertIn('brand_detail', logs.output[0])
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILER='cprofile')
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('quantri', password='matkhau-123')
+        cls.customer = User.objects.create_user('khach', password='matkhau-123')
+        cls.brand = Brand.objects.create(name='Hãng')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(PROFILE_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = '/brands/%d/' % self.brand.pk
+
+    def test_plain_flag_does_not_profile(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(self.url + '?_profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.client.get(self.url, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.list_captures(), [])
+
+    def test_signed_token_profiles(self):
+        self.client.force_login(self.admin)
+        token = profiling.make_token(self.admin)
+        response = self.client.get(self.url, {'_profile': token})
+        capture_id = response['X-Profile-Id']
+        response = self.client.get(self.url, HTTP_X_PROFILE=token)
+        self.assertIn('X-Profile-Id', response)
+        captures = profiling.list_captures()
+        self.assertEqual(len(captures), 2)
+        self.assertIn(capture_id, [capture.id for capture in captures])
+        self.assertEqual(captures[0].view, 'brand_detail')
+        page = self.client.get('/admin/profiles/')
+        self.assertContains(page, capture_id)
+        self.assertIn('token', page.context)
+
+    def test_token_bound_to_admin_user(self):
+        other = User.objects.create_superuser('quantri2', password='matkhau-123')
+        self.client.force_login(self.admin)
+        response = self.client.get(self.url, {'_profile': profiling.make_token(other)})
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.force_login(self.customer)
+        response = self.client.get(self.url, {'_profile': profiling.make_token(self.customer)})
+        self.assertNotIn('X-Profile-Id', response)
+
+    @override_settings(PROFILE_TOKEN_MAX_AGE=0)
+    def test_expired_token(self):
+        self.client.force_login(self.admin)
+        token = profiling.make_token(self.admin)
+        with mock.patch('django.core.signing.time.time', return_value=timezone.now().timestamp() + 5):
+            response = self.client.get(self.url, {'_profile': token})
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_capture_file_rejects_traversal(self):
+        self.client.force_login(self.admin)
+        self.assertIsNone(profiling.capture_file('../settings.json'))
+        response = self.client.get('/admin/profiles/..%2Fsettings.json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/admin/profiles/missing.json')
+        self.assertEqual(response.status_code, 404)
+
+
+class AdminOrdersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('quantri', password='matkhau-123')
+        cls.customer = User.objects.create_user('khach', password='matkhau-123')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_order(self, created_at=None, **fields):
+        fields.setdefault('payment_method', 'cod')
+        order = Order.objects.create(
+            user=self.customer, full_name='Khách', phone='0900000000', address='HN',
+            total=Decimal('100'), **fields,
+        )
+        if created_at:
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def local(self, *args):
+        return timezone.make_aware(timezone.datetime(*args))
+
+    def test_date_filter_uses_local_day(self):
+        # 00:10 giờ Việt Nam vẫn là ngày hôm trước theo UTC
+        early = self.create_order(self.local(2026, 3, 1, 0, 10))
+        late = self.create_order(self.local(2026, 3, 1, 23, 50))
+        self.create_order(self.local(2026, 2, 28, 23, 59))
+        self.create_order(self.local(2026, 3, 2, 0, 0))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/orders/', {'date_from': '2026-03-01', 'date_to': '2026-03-01'})
+        self.assertEqual({order.pk for order in response.context['page_obj']}, {early.pk, late.pk})
+        self.assertEqual(response.context['total_count'], 2)
+        self.assertFalse(any('cast_date' in query['sql'] for query in ctx.captured_queries))
+
+    def test_status_counts_follow_other_filters(self):
+        self.create_order(status='pending')
+        self.create_order(status='pending', payment_method='bank')
+        self.create_order(status='shipped')
+        response = self.client.get('/admin/orders/', {'payment': 'cod', 'status': 'pending'})
+        counts = {status: count for status, _, count in response.context['status_counts']}
+        self.assertEqual(counts['pending'], 1)
+        self.assertEqual(counts['shipped'], 1)
+        self.assertEqual(counts['cancelled'], 0)
+        self.assertEqual(response.context['total_count'], 2)
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    @mock.patch.object(views, 'ADMIN_ORDERS_PER_PAGE', 2)
+    def test_cursor_keeps_filters(self):
+        wanted = [self.create_order(self.local(2026, 3, 1, hour)).pk for hour in range(5)]
+        self.create_order(self.local(2026, 3, 5))
+        params = {'date_from': '2026-03-01', 'date_to': '2026-03-01'}
+        seen = []
+        response = self.client.get('/admin/orders/', params)
+        while True:
+            page = response.context['page_obj']
+            seen.extend(order.pk for order in page)
+            if not page.has_next():
+                break
+            self.assertIn('date_from=2026-03-01', response.context['filter_query'])
+            response = self.client.get('/admin/orders/', {**params, 'cursor': page.next_cursor})
+        self.assertEqual(sorted(seen), sorted(wanted))
+
+    def test_constant_queries(self):
+        url = '/admin/orders/?date_from=2000-01-01&payment=cod'
+
+        def count():
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            return len(ctx.captured_queries)
+
+        for _ in range(2):
+            self.create_order()
+        few = count()
+        for _ in range(8):
+            order = self.create_order()
+            OrderItem.objects.create(
+                order=order, product=create_phone(Brand.objects.create(name='Hãng %d' % order.pk)),
+                quantity=1, price=Decimal('100'),
+            )
+        self.assertEqual(count(), few)
+
+
+class OrderTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('quantri', password='matkhau-123')
+        cls.customer = User.objects.create_user('khach', password='matkhau-123')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_order(self, status='pending'):
+        return Order.objects.create(
+            user=self.customer, full_name='Khách', phone='0900000000', address='HN',
+            payment_method='cod', total=Decimal('100'), status=status,
+        )
+
+    def change_form(self, order, **changes):
+        data = {
+            'user': order.user_id, 'full_name': order.full_name, 'phone': order.phone,
+            'address': order.address, 'status': order.status, 'payment_method': order.payment_method,
+            'total': str(order.total), 'order_note': order.order_note or '',
+            'orderitem_set-TOTAL_FORMS': 0, 'orderitem_set-INITIAL_FORMS': 0,
+            'orderitem_set-MIN_NUM_FORMS': 0, 'orderitem_set-MAX_NUM_FORMS': 1000,
+        }
+        data.update(changes)
+        return self.client.post('/admin/store/order/%d/change/' % order.pk, data, follow=True)
+
+    def test_transition_table(self):
+        self.assertTrue(can_transition('pending', 'processing'))
+        self.assertTrue(can_transition('processing', 'cancelled'))
+        self.assertFalse(can_transition('shipped', 'cancelled'))
+        self.assertFalse(can_transition('completed', 'pending'))
+        self.assertEqual(TRANSITIONS['cancelled'], set())
+        self.assertEqual(sorted(allowed_sources('cancelled')), ['pending', 'processing'])
+        self.assertEqual(allowed_sources('pending'), [])
+
+    def test_bulk_transition_skips_invalid_orders(self):
+        pending, processing, shipped = (self.create_order(status) for status in ('pending', 'processing', 'shipped'))
+        changed = bulk_transition([pending.pk, processing.pk, shipped.pk], 'cancelled', self.admin)
+        self.assertEqual(sorted(changed), sorted([pending.pk, processing.pk]))
+        self.assertEqual(Order.objects.get(pk=shipped.pk).status, 'shipped')
+        self.assertEqual(Order.objects.filter(status='cancelled').count(), 2)
+        self.assertEqual(LogEntry.objects.count(), 2)
+        self.assertEqual(
+            set(NotificationOutbox.objects.values_list('order_id', flat=True)), {pending.pk, processing.pk},
+        )
+
+    def test_bulk_action_reports_skipped(self):
+        pending, shipped = self.create_order('pending'), self.create_order('shipped')
+        response = self.client.post('/admin/store/order/', {
+            'action': 'mark_processing', '_selected_action': [pending.pk, shipped.pk],
+        }, follow=True)
+        texts = [str(message) for message in response.context['messages']]
+        self.assertIn('Đã chuyển 1/2 đơn hàng sang "Đang xử lý".', texts)
+        self.assertIn('1 đơn hàng bị bỏ qua vì trạng thái hiện tại không cho phép.', texts)
+        self.assertEqual(Order.objects.get(pk=shipped.pk).status, 'shipped')
+
+    def test_change_form_logs_status_once(self):
+        order = self.create_order()
+        self.change_form(order, status='processing')
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'processing')
+        entries = LogEntry.objects.filter(object_id=str(order.pk))
+        self.assertEqual(entries.count(), 1)
+        self.assertIn('Đang xử lý', entries.get().change_message)
+        self.assertEqual(NotificationOutbox.objects.filter(order=order).count(), 1)
+
+    def test_change_form_with_other_fields(self):
+        order = self.create_order()
+        self.change_form(order, status='processing', address='HCM')
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.address), ('processing', 'HCM'))
+        messages = sorted(entry.get_change_message() for entry in LogEntry.objects.filter(object_id=str(order.pk)))
+        self.assertEqual(messages, ['Đã thay đổi Address.', 'Đã thay đổi trạng thái từ Đang chờ xử lý sang Đang xử lý'])
+
+    def test_change_form_reports_lost_race(self):
+        order = self.create_order()
+        with mock.patch('store.admin.bulk_transition', return_value=[]):
+            response = self.change_form(order, status='processing')
+        errors = [str(message) for message in response.context['messages'] if message.level_tag == 'error']
+        self.assertEqual(errors, ['Không thể chuyển đơn hàng #%d từ "Đang chờ xử lý" sang "Đang xử lý".' % order.pk])
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'pending')
+        self.assertFalse(LogEntry.objects.filter(object_id=str(order.pk)).exists())
+
+
+class FailingBackend:
+    def send(self, notification):
+        raise ConnectionError('máy chủ SMS không phản hồi')
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, notification):
+        self.sent.append(notification.pk)
+
+
+@override_settings(NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_RETRY_BASE=30, NOTIFICATION_RETRY_MAX=3600)
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('khach', password='matkhau-123')
+        cls.order = Order.objects.create(
+            user=cls.customer, full_name='Khách', phone='0900000000', address='HN',
+            payment_method='cod', total=Decimal('100'),
+        )
+
+    def queue(self, n=1):
+        return NotificationOutbox.objects.bulk_create([self.order.status_notification() for _ in range(n)])
+
+    def test_lease_not_shared(self):
+        self.queue(3)
+        first = notifications.claim(2, 60, owner='a')
+        second = notifications.claim(10, 60, owner='b')
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({n.pk for n in first} & {n.pk for n in second})
+        self.assertEqual(notifications.claim(10, 60, owner='c'), [])
+
+    def test_expired_lease_reclaimed(self):
+        notification, = self.queue()
+        notifications.claim(10, 60, owner='a')
+        NotificationOutbox.objects.update(leased_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = notifications.claim(10, 60, owner='b')
+        self.assertEqual([n.pk for n in reclaimed], [notification.pk])
+        self.assertEqual(NotificationOutbox.objects.get().lease_owner, 'b')
+
+    def test_delivery_marks_sent(self):
+        notification, = self.queue()
+        backend = RecordingBackend()
+        self.assertEqual(notifications.process_batch(backend=backend), (1, 0))
+        self.assertEqual(backend.sent, [notification.pk])
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.sent_at)
+        self.assertIsNone(notification.leased_until)
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual(notifications.process_batch(backend=backend), (0, 0))
+
+    def test_backoff_after_failure(self):
+        notification, = self.queue()
+        before = timezone.now()
+        with self.assertLogs('store.notifications', 'WARNING'):
+            self.assertEqual(notifications.process_batch(backend=FailingBackend()), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn('máy chủ SMS', notification.last_error)
+        self.assertIsNone(notification.sent_at)
+        self.assertGreaterEqual(notification.available_at, before + timedelta(seconds=24))
+        # Chưa đến hạn thử lại thì không được claim
+        self.assertEqual(notifications.claim(10, 60), [])
+        self.assertLess(notifications.retry_delay(1), notifications.retry_delay(3))
+        self.assertLessEqual(notifications.retry_delay(30), timedelta(seconds=3600 * 1.2))
+
+    def test_gives_up_after_max_attempts(self):
+        notification, = self.queue()
+        for _ in range(3):
+            NotificationOutbox.objects.update(available_at=timezone.now())
+            with self.assertLogs('store.notifications', 'WARNING'):
+                notifications.process_batch(backend=FailingBackend())
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 3)
+        self.assertIsNotNone(notification.failed_at)
+        NotificationOutbox.objects.update(available_at=timezone.now())
+        self.assertEqual(notifications.claim(10, 60), [])
+
+    def test_worker_once(self):
+        self.queue(2)
+        out = StringIO()
+        with override_settings(NOTIFICATION_BACKEND='store.tests.RecordingBackend'):
+            call_command('notification_worker', '--once', stdout=out)
+        self.assertIn('đã gửi 2, lỗi 0', out.getvalue())
+        self.assertFalse(notifications.pending().exists())
+
+    def test_worker_survives_database_error(self):
+        self.queue()
+        calls = []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            if len(calls) == 2:
+                return notifications.process_batch(*args)
+            raise KeyboardInterrupt
+
+        out, err = StringIO(), StringIO()
+        with mock.patch('store.management.commands.notification_worker.process_batch', flaky), \
+                mock.patch('store.management.commands.notification_worker.time.sleep'), \
+                override_settings(NOTIFICATION_BACKEND='store.tests.RecordingBackend'):
+            call_command('notification_worker', stdout=out, stderr=err)
+        self.assertIn('database is locked', err.getvalue())
+        self.assertIn('đã gửi 1, lỗi 0', out.getvalue())
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('quantri', password='matkhau-123')
+        cls.customer = User.objects.create_user('khach', password='matkhau-123')
+        cls.brands = [Brand.objects.create(name='Hãng %d' % i) for i in range(2)]
+
+    def setUp(self):
+        cache.clear()
+        self.phones = [create_phone(self.brands[0], 'Máy %d' % i, price=Decimal('10'), stock=20) for i in range(3)]
+
+    def buy(self, *quantities):
+        for phone, quantity in zip(self.phones, quantities):
+            if quantity:
+                Cart.objects.create(user=self.customer, phone=phone, quantity=quantity)
+        return place_order(self.customer, **CHECKOUT_FORM)
+
+    def rows(self):
+        return sorted(
+            SalesRollup.objects.exclude(units=0, order_count=0)
+            .values_list('day', 'phone_id', 'units', 'revenue', 'order_count')
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.rows()
+        reports.rebuild()
+        self.assertEqual(self.rows(), incremental)
+
+    def test_place_order_adds_rows(self):
+        self.buy(2, 1)
+        self.buy(1)
+        today = timezone.localdate()
+        self.assertEqual(self.rows(), [
+            (today, self.phones[0].pk, 3, Decimal('30'), 2),
+            (today, self.phones[1].pk, 1, Decimal('10'), 1),
+        ])
+        self.assertMatchesRebuild()
+
+    def test_cancel_matches_rebuild(self):
+        first = self.buy(2, 1)
+        self.buy(1, 0, 3)
+        bulk_transition([first.pk], 'cancelled', self.admin)
+        self.assertMatchesRebuild()
+
+    def test_cancel_after_brand_change(self):
+        first = self.buy(2, 1)
+        self.buy(1)
+        Phone.objects.filter(pk=self.phones[0].pk).update(brand=self.brands[1])
+        bulk_transition([first.pk], 'cancelled', self.admin)
+        self.assertMatchesRebuild()
+        summary = reports.sales_summary(timezone.localdate(), timezone.localdate())
+        self.assertEqual(
+            [(row['brand_name'], row['units']) for row in summary['brands']],
+            [('Hãng 1', 1)],
+        )
+        self.assertEqual(summary['totals']['units'], 1)
+
+    def test_rebuild_uses_local_day(self):
+        order = self.buy(1)
+        # 00:30 giờ Việt Nam, tức 17:30 hôm trước theo UTC
+        created_at = timezone.make_aware(timezone.datetime(2026, 3, 2, 0, 30))
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        reports.rebuild(since=created_at.date(), until=created_at.date())
+        self.assertEqual(
+            list(SalesRollup.objects.filter(day=created_at.date()).values_list('phone_id', 'units')),
+            [(self.phones[0].pk, 1)],
+        )
+
+    def test_apply_constant_queries(self):
+        day = timezone.localdate()
+
+        def count(phones):
+            deltas = {(day, phone.pk): [1, Decimal('10'), 1] for phone in phones}
+            with CaptureQueriesContext(connection) as ctx:
+                reports._apply(deltas)
+            return len(ctx.captured_queries)
+
+        count(self.phones[:1])
+        # Một dòng có sẵn + một dòng mới so với hai dòng có sẵn + một dòng mới
+        self.assertEqual(count(self.phones[:2]), count(self.phones))
+        self.assertEqual(
+            sorted(SalesRollup.objects.values_list('phone_id', 'units')),
+            [(self.phones[0].pk, 3), (self.phones[1].pk, 2), (self.phones[2].pk, 1)],
+        )
+
+    def test_sales_page(self):
+        self.buy(2)
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/sales/', {'days': 7})
+        self.assertContains(response, 'Hãng 0')
+        self.assertContains(response, 'Máy 0')
+
+
+class TestIsolationTests(TestCase):
+    def test_metrics_go_to_a_temporary_file(self):
+        self.assertEqual(os.path.dirname(settings.METRICS_DB_PATH), _metrics_dir)
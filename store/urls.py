@@ -10,16 +10,24 @@ urlpatterns = [
     path('remove-from-cart/<int:cart_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('update-cart-quantity/<int:cart_id>/', views.update_cart_quantity, name='update_cart_quantity'),
     path('cart/summary/', views.cart_summary, name='cart_summary'),
+    path('cart/api/add/<int:phone_id>/', views.api_add_to_cart, name='api_add_to_cart'),
+    path('cart/api/update/<int:cart_id>/', views.api_update_cart_quantity, name='api_update_cart_quantity'),
+    path('cart/api/remove/<int:cart_id>/', views.api_remove_from_cart, name='api_remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('order-complete/<int:order_id>/', views.order_complete, name='order_complete'),
     path('brands/', views.brand_list, name='brands'),
     path('brands/<int:brand_id>/', views.brand_detail, name='brand_detail'),
     path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('register/', views.register, name='register'),
     path('profile/', views.profile, name='profile'),
     path('checkout/', views.checkout, name='checkout'),
+    path('metrics', views.metrics, name='metrics'),
+    path('admin/profiles/', views.admin_profiles, name='admin_profiles'),
+    path('admin/profiles/<str:name>', views.admin_profile_file, name='admin_profile_file'),
+    path('admin/sales/', views.admin_sales, name='admin_sales'),
     path('admin/orders/', views.admin_orders, name='admin_orders'),
     path('admin/orders/<int:order_id>/update-status/', 
          views.update_order_status, name='update_order_status'),
@@ -1,30 +1,134 @@
 from django.shortcuts import render
 
 # Create your views here.
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from django.http import FileResponse, Http404, HttpResponse
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from . import profiling, reports
+from .metrics import render_prometheus
 from .models import Order, Profile
+from .orders import bulk_transition, can_transition, status_counts, with_item_totals
+from .pagination import KeysetPaginator
+from .permissions import is_admin
 
-def is_admin(user):
-    return user.is_superuser or user.is_staff
+ADMIN_ORDERS_PER_PAGE = 50
+
+def _order_filters(request):
+    """Đọc bộ lọc hợp lệ từ query string; giá trị sai bị bỏ qua."""
+    filters = {}
+    if request.GET.get('status') in dict(Order.STATUS_CHOICES):
+        filters['status'] = request.GET['status']
+    if request.GET.get('payment') in dict(Order.PAYMENT_CHOICES):
+        filters['payment'] = request.GET['payment']
+    for name in ('date_from', 'date_to'):
+        try:
+            value = parse_date(request.GET.get(name, ''))
+        except ValueError:
+            value = None
+        if value:
+            filters[name] = value
+    return filters
 
 @user_passes_test(is_admin)
 def admin_orders(request):
-    orders = Order.objects.all().order_by('-created_at')
-    return render(request, 'store/admin/orders.html', {'orders': orders})
+    filters = _order_filters(request)
+    orders = Order.objects.all()
+    if 'payment' in filters:
+        orders = orders.filter(payment_method=filters['payment'])
+    if 'date_from' in filters:
+        orders = orders.filter(created_at__gte=reports.day_start(filters['date_from']))
+    if 'date_to' in filters:
+        orders = orders.filter(created_at__lt=reports.day_start(filters['date_to'] + timedelta(days=1)))
+    # Số đơn theo trạng thái tính trên các bộ lọc khác, để thanh lọc luôn đủ mọi trạng thái
+    counts = status_counts(orders)
+    if 'status' in filters:
+        orders = orders.filter(status=filters['status'])
+
+    orders = with_item_totals(orders.select_related('user'))
+    page_obj = KeysetPaginator(orders, ADMIN_ORDERS_PER_PAGE).get_page(request.GET.get('cursor'))
+    for order in page_obj:
+        # Chỉ cho chọn các trạng thái hợp lệ theo TRANSITIONS
+        order.status_options = [
+            (value, label) for value, label in Order.STATUS_CHOICES
+            if value == order.status or can_transition(order.status, value)
+        ]
+    return render(request, 'store/admin/orders.html', {
+        'page_obj': page_obj,
+        'filters': filters,
+        'filter_query': urlencode({k: str(v) for k, v in filters.items()}),
+        'status_counts': [
+            (status, label, counts[status]) for status, label in Order.STATUS_CHOICES
+        ],
+        'total_count': sum(counts.values()),
+        'payment_choices': Order.PAYMENT_CHOICES,
+    })
+
+SALES_REPORT_RANGES = (7, 30, 90, 365)
+
+@user_passes_test(is_admin)
+def admin_sales(request):
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    if days not in SALES_REPORT_RANGES:
+        days = 30
+    until = timezone.localdate()
+    since = until - timedelta(days=days - 1)
+    summary = reports.sales_summary(since, until)
+    peak = max((row['revenue'] for row in summary['days']), default=0) or 1
+    for row in summary['days']:
+        row['percent'] = int(row['revenue'] * 100 / peak)
+    return render(request, 'store/admin/sales.html', {
+        'summary': summary,
+        'days': days,
+        'ranges': SALES_REPORT_RANGES,
+        'since': since,
+        'until': until,
+    })
+
+@user_passes_test(is_admin)
+def metrics(request):
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@user_passes_test(is_admin)
+def admin_profiles(request):
+    return render(request, 'store/admin/profiles.html', {
+        'captures': profiling.list_captures(),
+        'token': profiling.make_token(request.user),
+        'token_max_age': settings.PROFILE_TOKEN_MAX_AGE // 60,
+    })
+
+@user_passes_test(is_admin)
+def admin_profile_file(request, name):
+    path = profiling.capture_file(name)
+    if path is None:
+        raise Http404
+    return FileResponse(path.open('rb'), as_attachment=path.suffix == '.prof', filename=path.name)
 
 @user_passes_test(is_admin)
 def update_order_status(request, order_id):
     if request.method == 'POST':
         order = get_object_or_404(Order, id=order_id)
         new_status = request.POST.get('status')
-        if new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            order.save()
+        if new_status not in dict(Order.STATUS_CHOICES):
+            messages.error(request, 'Trạng thái không hợp lệ')
+        elif new_status == order.status:
+            pass
+        elif bulk_transition([order.id], new_status, request.user):
             messages.success(request, f'Đã cập nhật trạng thái đơn hàng #{order.id}')
         else:
-            messages.error(request, 'Trạng thái không hợp lệ')
+            messages.error(request, f'Không thể chuyển đơn hàng #{order.id} từ "{order.get_status_display()}" sang "{dict(Order.STATUS_CHOICES)[new_status]}"')
+    # Quay lại đúng trang và bộ lọc đang xem
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+        return redirect(next_url)
     return redirect('admin_orders')
 
 from django.shortcuts import render, get_object_or_404, redirect
@@ -32,62 +136,193 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm  # Thêm dòng này
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
-from .models import Phone, Brand, Cart, Order, OrderItem
+from functools import wraps
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from .models import Phone, Brand, Cart, Order
 from django.core.paginator import Paginator
+from .cache import cached_count, get_or_render_grid
+from .pagination import KeysetPaginator, decode_cursor, encode_cursor
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from .cart import add_item, load_cart, remove_item, set_quantity
+from .conditional import catalog_etag, catalog_last_modified, phone_etag, phone_last_modified
+from .directory import brand_directory
+from .orders import EmptyCart, OutOfStock, place_order
+from .search import PhoneSearch
+from . import anon_cart, suggest
 
+def _render_phone_grid(phones, page, count):
+    # Phân trang, mỗi trang 12 sản phẩm; ``count`` là hàm trả về tổng số (chỉ gọi khi cần)
+    if settings.CATALOG_PAGINATION == 'keyset':
+        paginator = KeysetPaginator(phones, 12, count=count)
+        page_obj = paginator.get_page(page)
+    else:
+        paginator = Paginator(phones, 12)
+        page_obj = paginator.get_page(page)
+        page_obj.page_range = paginator.get_elided_page_range(page_obj.number)
+    return render_to_string('store/includes/phone_grid.html', {
+        'page_obj': page_obj,
+        'keyset': settings.CATALOG_PAGINATION == 'keyset',
+    })
+
+def _page_key(request):
+    """Chuẩn hoá tham số trang để dùng làm khoá cache."""
+    if settings.CATALOG_PAGINATION == 'keyset':
+        position = decode_cursor(request.GET.get('cursor'))
+        return encode_cursor(*position) if position else None
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def home(request):
-    brands = Brand.objects.all()
-    phones_list = Phone.objects.order_by('-id').all()
-    
-    # Phân trang, mỗi trang 8 sản phẩm
-    paginator = Paginator(phones_list, 12)
-    page = request.GET.get('page')
-    featured_phones = paginator.get_page(page)
+    brands = brand_directory()
+    page = _page_key(request)
+    grid_html = get_or_render_grid(
+        'home',
+        # Tổng số lấy từ BrandSummary đã nạp cho danh sách thương hiệu, không COUNT(*) cả bảng
+        lambda: _render_phone_grid(
+            Phone.objects.order_by('-id'), page, lambda: sum(brand.phone_count for brand in brands),
+        ),
+        page=page,
+    )
     
     return render(request, 'store/home.html', {
         'brands': brands,
-        'featured_phones': featured_phones
+        'grid_html': grid_html
     })
 
+PHONE_ROWS_MARKER = '<!-- phone-rows -->'
+PHONE_LIST_CHUNK_SIZE = 200
+
+def _stream_phone_rows(head, tail):
+    yield head
+    row_template = get_template('store/includes/phone_row.html')
+    phones = Phone.objects.select_related('brand').order_by('-id')
+    chunk = []
+    for phone in phones.iterator(chunk_size=PHONE_LIST_CHUNK_SIZE):
+        chunk.append(row_template.render({'phone': phone}))
+        if len(chunk) >= PHONE_LIST_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+    yield tail
+
 def phone_list(request):
-    phones = Phone.objects.all()
+    if settings.PHONE_LIST_STREAMING:
+        # Gửi phần đầu trang ngay, sau đó từng khối sản phẩm đọc bằng iterator()
+        page = render_to_string('store/phone_list.html', {
+            'streaming': True,
+            'rows_marker': PHONE_ROWS_MARKER,
+        }, request)
+        head, tail = page.split(PHONE_ROWS_MARKER, 1)
+        return StreamingHttpResponse(_stream_phone_rows(head, tail))
+    phones = Phone.objects.select_related('brand').order_by('-id')
     return render(request, 'store/phone_list.html', {'phones': phones})
 
+@cache_control(no_cache=True)
+@condition(etag_func=phone_etag, last_modified_func=phone_last_modified)
 def phone_detail(request, phone_id):
     phone = get_object_or_404(Phone, id=phone_id)
     return render(request, 'store/phone_detail.html', {'phone': phone})
 
-@login_required
 def add_to_cart(request, phone_id):
     if request.method == 'POST':  # Chỉ xử lý request POST
         phone = get_object_or_404(Phone, id=phone_id)
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user,
-            phone=phone,
-            defaults={'quantity': 1}
-        )
-        
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
+        if not request.user.is_authenticated:
+            # Khách chưa đăng nhập: giỏ hàng nằm trong cookie, không ghi CSDL
+            items = anon_cart.read(request)
+            items[phone.id] = items.get(phone.id, 0) + 1
+            messages.success(request, f"{phone.name} đã được thêm vào giỏ hàng!")
+            response = redirect('cart')
+            anon_cart.write(response, items)
+            return response
+        if not add_item(request.user, phone.id):
+            messages.error(request, f"{phone.name} đã hết hàng!")
+            return redirect('phone_detail', phone_id=phone_id)
         
         messages.success(request, f"{phone.name} đã được thêm vào giỏ hàng!")
         return redirect('cart')
     return redirect('phone_detail', phone_id=phone_id)
 
-@login_required
+def _cart_json(snapshot, line_id=None):
+    line = next((line for line in snapshot.lines if line.id == line_id), None)
+    return {
+        'line': line and {
+            'id': line.id,
+            'phone_id': line.phone.id,
+            'name': line.phone.name,
+            'price': str(line.phone.price),
+            'quantity': line.quantity,
+            'total_price': str(line.total_price),
+        },
+        'total': str(snapshot.total),
+        'count': snapshot.count,
+    }
+
+def _login_required_json(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'login_required'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+@require_POST
+@_login_required_json
+def api_add_to_cart(request, phone_id):
+    phone = get_object_or_404(Phone, id=phone_id)
+    if not add_item(request.user, phone.id):
+        return JsonResponse({'error': 'out_of_stock'}, status=409)
+    snapshot = load_cart(request.user)
+    line_id = next((line.id for line in snapshot.lines if line.phone.id == phone.id), None)
+    return JsonResponse(_cart_json(snapshot, line_id))
+
+@require_POST
+@_login_required_json
+def api_update_cart_quantity(request, cart_id):
+    cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except ValueError:
+        return JsonResponse({'error': 'invalid_quantity'}, status=400)
+    if not set_quantity(request.user, cart_item, quantity):
+        return JsonResponse({'error': 'out_of_stock'}, status=409)
+    return JsonResponse(_cart_json(load_cart(request.user), cart_item.id))
+
+@require_POST
+@_login_required_json
+def api_remove_from_cart(request, cart_id):
+    cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
+    remove_item(request.user, cart_item)
+    return JsonResponse(_cart_json(load_cart(request.user)))
+
 def cart(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    total = sum(item.total_price for item in cart_items)
+    if request.user.is_authenticated:
+        snapshot = load_cart(request.user)
+    else:
+        snapshot = anon_cart.load_snapshot(anon_cart.read(request))
     return render(request, 'store/cart.html', {
-        'cart_items': cart_items,
-        'total': total
+        'cart': snapshot,
+        'cart_items': snapshot.lines,
+        'total': snapshot.total
     })
 
-@login_required
 def remove_from_cart(request, cart_id):
+    if not request.user.is_authenticated:
+        # Với giỏ trong cookie, cart_id chính là phone_id
+        items = anon_cart.read(request)
+        items.pop(cart_id, None)
+        messages.success(request, "Sản phẩm đã được xóa khỏi giỏ hàng!")
+        response = redirect('cart')
+        anon_cart.write(response, items)
+        return response
     cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
-    cart_item.delete()
+    remove_item(request.user, cart_item)
     messages.success(request, "Sản phẩm đã được xóa khỏi giỏ hàng!")
     return redirect('cart')
 
@@ -95,30 +330,49 @@ def search(request):
     query = request.GET.get('q', '')
     results = []
     if query:
-        results = Phone.objects.filter(name__icontains=query)
+        paginator = Paginator(PhoneSearch(query), 12)
+        results = paginator.get_page(request.GET.get('page'))
     return render(request, 'store/search.html', {
         'query': query,
         'results': results
     })
 
+def search_suggest(request):
+    query = request.GET.get('q', '')[:100]
+    return JsonResponse({
+        'query': query,
+        'suggestions': suggest.index.suggest(query),
+    })
+
 def brand_list(request):
-    brands = Brand.objects.all()
+    brands = brand_directory()
     return render(request, 'store/brands.html', {'brands': brands})
 
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def brand_detail(request, brand_id):
     brand = get_object_or_404(Brand, pk=brand_id)
-    phones = brand.phone_set.all().order_by('-id')
-    
-    # Pagination
-    paginator = Paginator(phones, 12)
-    page = request.GET.get('page')
-    phones = paginator.get_page(page)
+    page = _page_key(request)
+    grid_html = get_or_render_grid(
+        'brand_detail',
+        lambda: _render_phone_grid(
+            brand.phone_set.all().order_by('-id'), page,
+            lambda: cached_count('brand:%d' % brand.pk, brand.phone_set.all()),
+        ),
+        brand_id=brand.pk,
+        page=page,
+    )
     
     return render(request, 'store/brand_detail.html', {
         'brand': brand,
-        'phones': phones
+        'grid_html': grid_html
 })
 
+def _merge_anon_cart(request, response, user):
+    skipped = anon_cart.merge_into(request, response, user)
+    if skipped:
+        messages.warning(request, 'Không đủ hàng cho: %s' % ', '.join(phone.name for phone in skipped))
+
 def register(request):
     if request.user.is_authenticated:
         return redirect('home')
@@ -129,7 +383,9 @@ def register(request):
             user = form.save()
             login(request, user)
             messages.success(request, 'Registration successful!')
-            return redirect('home')
+            response = redirect('home')
+            _merge_anon_cart(request, response, user)
+            return response
     else:
         form = UserCreationForm()
         
@@ -147,7 +403,9 @@ def login_view(request):
         if user is not None:
             login(request, user)
             messages.success(request, 'Login successful!')
-            return redirect('home')
+            response = redirect('home')
+            _merge_anon_cart(request, response, user)
+            return response
         else:
             messages.error(request, 'Invalid username or password')
     
@@ -183,63 +441,65 @@ def profile(request):
         'orders': orders
     })
 
-@login_required
 def update_cart_quantity(request, cart_id):
     if request.method == 'POST':
-        quantity = int(request.POST.get('quantity', 1))
-        cart_item = Cart.objects.get(id=cart_id)
-        cart_item.quantity = quantity
-        cart_item.save()
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except ValueError:
+            messages.error(request, 'Số lượng không hợp lệ!')
+            return redirect('cart')
+        if not request.user.is_authenticated:
+            items = anon_cart.read(request)
+            if cart_id in items:
+                items[cart_id] = quantity
+            response = redirect('cart')
+            anon_cart.write(response, items)
+            return response
+        cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
+        if not set_quantity(request.user, cart_item, quantity):
+            messages.error(request, 'Không đủ hàng cho số lượng này!')
     return redirect('cart')
 
 @login_required 
 def cart_summary(request):
-    cart = Cart.objects.filter(user=request.user)
-    total = sum(item.total_price for item in cart)
+    snapshot = load_cart(request.user)
     return render(request, 'store/cart_summary.html', {
-        'cart': cart,
-        'total': total
+        'cart': snapshot,
+        'total': snapshot.total
     })
 
 @login_required
 def checkout(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    if not cart_items.exists():
-        messages.warning(request, 'Giỏ hàng trống!')
-        return redirect('cart')
-        
-    total = sum(item.total_price for item in cart_items)
-        
     if request.method == 'POST':
         form_data = request.POST
-        order = Order.objects.create(
-            user=request.user,
-            full_name=form_data['full_name'],
-            phone=form_data['phone'],
-            address=form_data['address'],
-            payment_method=form_data['payment_method'],
-            order_note=form_data.get('order_note', ''),
-            total=total
-        )
-        
-        # Create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.phone,
-                quantity=cart_item.quantity, 
-                price=cart_item.phone.price
+        try:
+            order = place_order(
+                request.user,
+                full_name=form_data['full_name'],
+                phone=form_data['phone'],
+                address=form_data['address'],
+                payment_method=form_data['payment_method'],
+                order_note=form_data.get('order_note', ''),
             )
-            
-        # Clear cart
-        cart_items.delete()
+        except EmptyCart:
+            messages.warning(request, 'Giỏ hàng trống!')
+            return redirect('cart')
+        except OutOfStock as exc:
+            messages.error(request, 'Không đủ hàng cho: %s' % ', '.join(p.name for p in exc.phones))
+            return redirect('cart')
         
         messages.success(request, 'Đặt hàng thành công!')
         return redirect('order_complete', order_id=order.id)
         
+    snapshot = load_cart(request.user)
+    if not snapshot:
+        messages.warning(request, 'Giỏ hàng trống!')
+        return redirect('cart')
+        
     return render(request, 'store/checkout.html', {
-        'cart_items': cart_items,
-        'total': total
+        'cart': snapshot,
+        'cart_items': snapshot.lines,
+        'total': snapshot.total
     })
 
 @login_required